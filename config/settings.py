@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 
 from pathlib import Path
 import os
+import sys
+import tempfile
 from dotenv import load_dotenv
 
 # .env ファイルから環境変数を読み込む
@@ -24,6 +26,9 @@ except Exception as e:
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# manage.py test で実行中か（テスト中はキャッシュ・ログをリポジトリ内のファイルに書き込まない）
+TESTING = sys.argv[1:2] == ['test']
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/4.2/howto/deployment/checklist/
@@ -64,6 +69,13 @@ EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', 'ag-mails@ag-media.co.jp')
 EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', 'wvllexijazsmhbad')  # アプリパスワード
 # 通知先のメールアドレス（オプション）
 EMAIL_NOTIFICATION = 'leader@example.com'
+# 送信キュー（python manage.py send_queued_mail --loop で送信）
+MAIL_QUEUE_BATCH_SIZE = int(os.environ.get('MAIL_QUEUE_BATCH_SIZE', 50))  # 1回の接続で送信する最大件数
+MAIL_QUEUE_MAX_ATTEMPTS = int(os.environ.get('MAIL_QUEUE_MAX_ATTEMPTS', 5))  # この回数失敗したら再送しない
+MAIL_QUEUE_RETRY_SECONDS = int(os.environ.get('MAIL_QUEUE_RETRY_SECONDS', 60))  # 再送間隔（失敗ごとに倍）
+MAIL_QUEUE_RETRY_MAX_SECONDS = int(os.environ.get('MAIL_QUEUE_RETRY_MAX_SECONDS', 3600))
+# 送信中のまま、この秒数を過ぎたメールは送信ワーカーが落ちたとみなして再度取得する
+MAIL_QUEUE_CLAIM_SECONDS = int(os.environ.get('MAIL_QUEUE_CLAIM_SECONDS', 600))
 
 # Application definition
 
@@ -78,6 +90,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # リクエストの計測（REQUEST_METRICS_ENABLED=1 のときだけ有効）
+    'report.metrics.RequestMetricsMiddleware',
+    # レスポンスの gzip 圧縮（本文を書き換えるため、本文を読む・変更するミドルウェアより前に置く）
+    'report.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -119,8 +135,65 @@ DATABASES = {
         'NAME': BASE_DIR / 'db.sqlite3',
         'OPTIONS': {
             'timeout': 20,  # SQLite同時書き込み待機時間
-        }
+            # 既定は DEFERRED（読み込みだけのトランザクションは書き込みロックを取らない）。
+            # 書き込む処理は report.db.write_atomic で開始時に書き込みロックを取得する
+            'transaction_mode': os.environ.get('SQLITE_TRANSACTION_MODE') or None,
+        },
+        # 接続を使い回して、接続ごとのPRAGMA設定を毎リクエスト行わないようにする
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
+    }
+}
+
+# キャッシュ（一覧の件数・絞り込みの選択肢・セッションなど）
+# Waitress を複数プロセスで起動しても共有できるよう、プロセス内のメモリではなくファイルに置く
+# CACHE_BACKEND=sqlite（既定）: 日報とは別の cache.sqlite3 に保存（日報の保存と書き込みロックを取り合わない）
+# CACHE_BACKEND=file: CACHE_DIR（既定 cache/）以下に1件1ファイルで保存
+# CACHE_BACKEND=locmem: プロセス内のメモリに保存（テストの既定。複数プロセスでは共有されない）
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'locmem' if TESTING else 'sqlite')
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 20000))
+if CACHE_BACKEND == 'locmem':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {'MAX_ENTRIES': CACHE_MAX_ENTRIES},
+        },
+    }
+elif CACHE_BACKEND == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'report.cachestore.StatsFileBasedCache',
+            'LOCATION': os.environ.get('CACHE_DIR', str(BASE_DIR / 'cache')),
+            'OPTIONS': {'MAX_ENTRIES': CACHE_MAX_ENTRIES},
+        },
     }
+else:
+    DATABASES['cache'] = {
+        **DATABASES['default'],
+        'NAME': BASE_DIR / 'cache.sqlite3',
+        'OPTIONS': dict(DATABASES['default']['OPTIONS']),
+    }
+    DATABASE_ROUTERS = ['report.routers.CacheRouter']
+    CACHES = {
+        'default': {
+            'BACKEND': 'report.cachestore.StatsDatabaseCache',
+            'LOCATION': 'report_cache',
+            'OPTIONS': {'MAX_ENTRIES': CACHE_MAX_ENTRIES},
+        },
+    }
+
+# セッションはキャッシュから読み、変更があったときだけDBにも書き込む（ページごとの django_session の読み込みをなくす）
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+# SQLiteの接続時に設定するPRAGMA（report/db.py で適用。空文字にすると設定しない）
+# WALにすると一覧の読み込み中でも日報を保存でき、"database is locked" が起きにくくなる
+SQLITE_PRAGMAS = {
+    'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'busy_timeout': os.environ.get('SQLITE_BUSY_TIMEOUT', '20000'),  # ミリ秒
+    'cache_size': os.environ.get('SQLITE_CACHE_SIZE', '-20000'),  # 負の値はKiB単位（約20MB）
+    'mmap_size': os.environ.get('SQLITE_MMAP_SIZE', '134217728'),  # 128MB
+    'temp_store': os.environ.get('SQLITE_TEMP_STORE', 'MEMORY'),
 }
 
 
@@ -161,7 +234,122 @@ USE_TZ = True
 STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / "static"
 
+# collectstatic でハッシュ付きのファイル名と .gz を作る（Caddy が .gz をそのまま長期キャッシュ付きで配信する）
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'report.storage.CompressedManifestStaticFilesStorage',
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# CSVエクスポート設定（1回のクエリで読み込む日報の件数）
+REPORT_EXPORT_CHUNK_SIZE = int(os.environ.get('REPORT_EXPORT_CHUNK_SIZE', 500))
+
+# CSVインポート設定（bulk_create / 日報検索を1回で処理する件数）
+REPORT_IMPORT_BATCH_SIZE = int(os.environ.get('REPORT_IMPORT_BATCH_SIZE', 500))
+# 1トランザクションでコミットするCSVの行数（途中で失敗した場合はここから再開できる）
+REPORT_IMPORT_COMMIT_SIZE = int(os.environ.get('REPORT_IMPORT_COMMIT_SIZE', 5000))
+
+# 差分エクスポート（/export/delta/）で、直近この秒数以内の更新は次回に回す（保存中の日報を取りこぼさないため）
+DELTA_EXPORT_LAG_SECONDS = int(os.environ.get('DELTA_EXPORT_LAG_SECONDS', 60))
+
+# 日報一覧の件数・ページ境界などをキャッシュする秒数（日報が変更されると即座に無効になる）
+REPORT_CACHE_SECONDS = int(os.environ.get('REPORT_CACHE_SECONDS', 300))
+
+# レスポンスの gzip 圧縮（管理画面のHTML・CSVエクスポート）
+GZIP_ENABLED = os.environ.get('GZIP_ENABLED', '1') == '1'
+# これより小さいレスポンスは圧縮しない（バイト）
+GZIP_MIN_LENGTH = int(os.environ.get('GZIP_MIN_LENGTH', 1024))
+# 圧縮しない Content-Type は GZIP_EXCLUDED_CONTENT_TYPES で変更できる（既定は report/compression.py）
+
+# ログの出力先（テスト中はリポジトリの logs/ ではなく一時ディレクトリに書き込む）
+LOG_DIR = (
+    os.path.join(tempfile.gettempdir(), 'daily_report_test_logs') if TESTING
+    else os.path.join(BASE_DIR, 'logs')
+)
+# ログファイル名の末尾（serve_waitress.py --workers で複数起動したとき、プロセスごとに "-8001" などが入る）
+LOG_FILE_SUFFIX = os.environ.get('LOG_FILE_SUFFIX', '')
+
+# リクエストの計測（処理時間・DB時間・クエリ数・レスポンスサイズ）
+REQUEST_METRICS_ENABLED = os.environ.get('REQUEST_METRICS_ENABLED', '0') == '1'
+# これ以上かかったリクエストを logs/slow_requests.jsonl に書き出す（ミリ秒）
+REQUEST_METRICS_SLOW_MS = int(os.environ.get('REQUEST_METRICS_SLOW_MS', 1000))
+REQUEST_METRICS_SLOW_LOG = os.path.join(LOG_DIR, f'slow_requests{LOG_FILE_SUFFIX}.jsonl')
+# 計測画面で集計する直近の時間（秒）と、URLごとに保持する件数
+REQUEST_METRICS_WINDOW_SECONDS = int(os.environ.get('REQUEST_METRICS_WINDOW_SECONDS', 3600))
+REQUEST_METRICS_MAX_SAMPLES = int(os.environ.get('REQUEST_METRICS_MAX_SAMPLES', 1000))
+
+# ログ設定
+# 書き込みは QueueListener のバックグラウンドスレッドで行い、リクエストの処理を待たせない
+# logs/app.jsonl（INFO以上）・logs/error.jsonl（WARNING以上）に1行1件のJSONで出力する
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+LOG_MAX_BYTES = int(os.environ.get('LOG_MAX_BYTES', 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.environ.get('LOG_BACKUP_COUNT', 10))
+
+# ロガーごとのレベル（環境変数 LOG_LEVELS="report.admin=DEBUG,django.request=INFO" で上書きできる）
+LOG_LEVELS = {
+    'django': 'INFO',
+    'django.db.backends': 'WARNING',
+    'report': 'INFO',
+    # 画面表示ごとの権限判定などの詳細は DEBUG で出力している
+    'report.admin': 'INFO',
+    'waitress': 'INFO',
+}
+for item in os.environ.get('LOG_LEVELS', '').split(','):
+    if '=' in item:
+        name, level = item.split('=', 1)
+        LOG_LEVELS[name.strip()] = level.strip().upper()
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'console': {
+            'format': '%(asctime)s %(levelname)s %(name)s: %(message)s',
+        },
+    },
+    'handlers': {
+        'queue': {
+            '()': 'report.logutils.QueueListenerHandler',
+            'max_bytes': LOG_MAX_BYTES,
+            'backup_count': LOG_BACKUP_COUNT,
+            'targets': [
+                {'filename': os.path.join(LOG_DIR, f'app{LOG_FILE_SUFFIX}.jsonl'), 'level': 'INFO'},
+                {'filename': os.path.join(LOG_DIR, f'error{LOG_FILE_SUFFIX}.jsonl'), 'level': 'WARNING'},
+            ],
+        },
+        'slow_requests': {
+            '()': 'report.logutils.QueueListenerHandler',
+            'max_bytes': LOG_MAX_BYTES,
+            'backup_count': 5,
+            'targets': [
+                {'filename': REQUEST_METRICS_SLOW_LOG, 'format': 'message'},
+            ],
+        },
+        # NSSM で waitress-err.log に残るよう、警告以上は標準エラーにも出す
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'console',
+            'level': 'WARNING',
+        },
+    },
+    'root': {
+        'handlers': ['queue', 'console'],
+        'level': LOG_LEVEL,
+    },
+    'loggers': {
+        **{name: {'level': level} for name, level in LOG_LEVELS.items()},
+        'report.slow_requests': {
+            'handlers': ['slow_requests'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
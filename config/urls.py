@@ -16,7 +16,7 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
-from report.views import export_csv, export_view, import_csv, export_users_csv
+from report.views import export_csv, export_delta, export_view, import_csv, export_users_csv, work_summary, work_summary_csv, request_metrics, cache_stats, healthz
 from django.shortcuts import redirect
 
 # 管理サイトのタイトルとヘッダーを変更
@@ -33,6 +33,12 @@ urlpatterns = [
     path('accounts/', include('django.contrib.auth.urls')),  # 認証URL追加
     path('export/', export_view, name='export_view'),
     path('export/csv/', export_csv, name='export_csv'),
+    path('export/delta/', export_delta, name='export_delta'),
     path('export/users/csv/', export_users_csv, name='export_users_csv'),
     path('import/csv/', import_csv, name='import_csv'),
+    path('summary/', work_summary, name='work_summary'),
+    path('summary/csv/', work_summary_csv, name='work_summary_csv'),
+    path('metrics/', request_metrics, name='request_metrics'),
+    path('cache/', cache_stats, name='cache_stats'),
+    path('healthz/', healthz, name='healthz'),  # Caddy の死活監視用
 ]
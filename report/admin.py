@@ -1,11 +1,14 @@
 from django.contrib import admin, messages
 from django import forms
-from .models import DailyReport, DailyReportDetail, UserProfile
+from .models import DailyReport, DailyReportDetail, UserProfile, OutboundEmail
+from .mailqueue import enqueue_email
+from .exports import report_csv_response
 from django.forms.models import BaseInlineFormSet
 from django.utils import timezone
+from datetime import time
+from django.db import router, transaction
 from django.utils.safestring import mark_safe
 import logging
-from django.core.mail import send_mail
 from django.conf import settings
 from django.contrib.auth.models import Group, User
 from django.http import HttpResponseRedirect
@@ -14,6 +17,14 @@ from django.urls import reverse
 from django.urls import path
 from django.utils.html import format_html
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.contrib.admin.views.main import ChangeList
+from django.contrib.admin.options import csrf_protect_m
+from .roles import get_roles
+from .db import write_atomic
+from . import caching, conditional, search, summaries
+from .pagination import KeysetPaginator
+from .filters import UserListFilter
+from django.db.models import Q
 
 logger = logging.getLogger(__name__)
 
@@ -51,7 +62,7 @@ class DailyReportDetailInline(admin.TabularInline):
     def get_extra(self, request, obj=None, **kwargs):
         if obj:
             return 0
-        if request.user.groups.filter(name='パターンD').exists():
+        if get_roles(request).in_group('パターンD'):
             return 0
         return 7
 
@@ -60,38 +71,34 @@ class DailyReportDetailInline(admin.TabularInline):
         class InitialFormSet(FormSet):
             def __init__(self, *args, **kwargs):
                 if not obj:  # 新規作成時のみ初期値をセット
+                    # 初期値は datetime.time で渡す（文字列だと、入力欄の値と比べて常に「変更あり」になり、
+                    # 触っていない行まで保存される）
                     # ユーザーのグループに基づいて初期値を設定
-                    if request.user.groups.filter(name='パターンD').exists():
+                    roles = get_roles(request)
+                    if roles.in_group('パターンD'):
                         initial = []
-                    elif request.user.groups.filter(name='パターンC').exists():
+                    elif roles.in_group('パターンC'):
+                        # 時刻は空欄（ブラウザでは --:-- と表示される）
+                        initial = [{'start_time': None, 'end_time': None} for _ in range(7)]
+                    elif roles.in_group('パターンB'):
                         initial = [
-                            {'start_time': '--:--', 'end_time': '--:--'},
-                            {'start_time': '--:--', 'end_time': '--:--'},
-                            {'start_time': '--:--', 'end_time': '--:--'},
-                            {'start_time': '--:--', 'end_time': '--:--'},
-                            {'start_time': '--:--', 'end_time': '--:--'},
-                            {'start_time': '--:--', 'end_time': '--:--'},
-                            {'start_time': '--:--', 'end_time': '--:--'},
-                        ]
-                    elif request.user.groups.filter(name='パターンB').exists():
-                        initial = [
-                            {'start_time': '08:30', 'end_time': '09:30'},
-                            {'start_time': '09:30', 'end_time': '10:30'},
-                            {'start_time': '10:30', 'end_time': '11:30'},
-                            {'start_time': '12:30', 'end_time': '13:30'},
-                            {'start_time': '13:30', 'end_time': '14:30'},
-                            {'start_time': '14:30', 'end_time': '15:30'},
-                            {'start_time': '15:30', 'end_time': '17:00'},
+                            {'start_time': time(8, 30), 'end_time': time(9, 30)},
+                            {'start_time': time(9, 30), 'end_time': time(10, 30)},
+                            {'start_time': time(10, 30), 'end_time': time(11, 30)},
+                            {'start_time': time(12, 30), 'end_time': time(13, 30)},
+                            {'start_time': time(13, 30), 'end_time': time(14, 30)},
+                            {'start_time': time(14, 30), 'end_time': time(15, 30)},
+                            {'start_time': time(15, 30), 'end_time': time(17)},
                         ]
                     else:  # パターンAまたはその他のユーザー
                         initial = [
-                            {'start_time': '09:00', 'end_time': '10:00'},
-                            {'start_time': '10:00', 'end_time': '11:00'},
-                            {'start_time': '11:00', 'end_time': '12:00'},
-                            {'start_time': '13:00', 'end_time': '14:00'},
-                            {'start_time': '14:00', 'end_time': '15:00'},
-                            {'start_time': '15:00', 'end_time': '16:00'},
-                            {'start_time': '16:00', 'end_time': '17:30'},
+                            {'start_time': time(9), 'end_time': time(10)},
+                            {'start_time': time(10), 'end_time': time(11)},
+                            {'start_time': time(11), 'end_time': time(12)},
+                            {'start_time': time(13), 'end_time': time(14)},
+                            {'start_time': time(14), 'end_time': time(15)},
+                            {'start_time': time(15), 'end_time': time(16)},
+                            {'start_time': time(16), 'end_time': time(17, 30)},
                         ]
                     kwargs['initial'] = initial
                 super().__init__(*args, **kwargs)
@@ -118,18 +125,47 @@ class DailyReportForm(forms.ModelForm):
             'comment': forms.Textarea(attrs={'rows': 4}),
         }
 
+class DailyReportChangeList(ChangeList):
+    """一覧画面用のChangeList
+
+    上司確認の編集可否（can_edit）をSQLで付与し、作業詳細を表示する列がある場合は
+    作業詳細をまとめて prefetch することで、1ページの表示件数に関係なくクエリ数を一定にする。
+    """
+    # 作業詳細（obj.details）を読む一覧の列
+    DETAIL_COLUMNS = {'get_work_titles'}
+
+    def get_queryset(self, request, exclude_parameters=None):
+        qs = super().get_queryset(request, exclude_parameters)
+        # 作業詳細を表示しない場合は、使われない prefetch のクエリを発行しない
+        if self.DETAIL_COLUMNS.intersection(self.list_display):
+            qs = qs.prefetch_related('details')
+        return get_roles(request).annotate_can_confirm(qs)
+
 @admin.register(DailyReport)
 class DailyReportAdmin(admin.ModelAdmin):
 
     change_form_template = "report/change_form.html"
+    # 日付階層（date_hierarchy）の日付一覧をキャッシュから表示する
+    change_list_template = "report/change_list.html"
 
     form = DailyReportForm
     list_display = ('date', 'user', 'boss_confirmation', 'is_submitted', 'comment')
-    list_filter = ('boss_confirmation', 'is_submitted', 'date', 'user')
-    search_fields = ('user__username', 'remarks')
+    # ユーザーの選択肢は閲覧できるユーザーのみ（キャッシュから表示）
+    list_filter = ('boss_confirmation', 'is_submitted', 'date', UserListFilter)
+    # 全文検索インデックスがない場合（SQLite以外など）に使う検索対象
+    search_fields = (
+        'user__username', 'remarks', 'comment',
+        'details__work_title', 'details__client', 'details__responsible_person',
+    )
+    search_help_text = 'ユーザー名・報告事項・コメント・作業内容・得意先・担当者で検索できます'
     date_hierarchy = 'date'
-    ordering = ('-date',)
+    # (date, id) の続きから次のページを取得できるよう、並び順を一意にする
+    ordering = ('-date', '-id')
+    paginator = KeysetPaginator
+    # 絞り込み前の全件数（COUNT(*)）を毎回数えない
+    show_full_result_count = False
     inlines = [DailyReportDetailInline]
+    actions = ['export_selected_csv']
     
     # 「保存してもう1つ追加」と「保存して編集を続ける」ボタンを非表示にする設定
     save_on_top = False  # 上部の保存ボタンを非表示
@@ -172,69 +208,57 @@ class DailyReportAdmin(admin.ModelAdmin):
             form.base_fields['date'].initial = timezone.now().date()
         
         # リーダーおよび管理者以外はコメントフィールドを無効化
-        is_superuser = request.user.is_superuser
-        is_leader = request.user.groups.filter(name='リーダー').exists()
-        logger.info(f"Get form - User: {request.user.username}, Leader: {is_leader}, Super: {is_superuser}")
+        roles = get_roles(request)
+        logger.debug("Get form - User: %s, Leader: %s, Super: %s",
+                     request.user.username, roles.is_leader, roles.is_superuser)
         
         # commentフィールドの存在チェック
         if 'comment' in form.base_fields:
-            if not is_superuser and not is_leader:
+            if not roles.can_confirm:
                 form.base_fields['comment'].widget.attrs['disabled'] = 'disabled'
                 form.base_fields['comment'].widget.attrs['readonly'] = 'readonly'
             else:
                 # リーダーまたは管理者の場合は編集可能に
                 form.base_fields['comment'].widget.attrs.pop('disabled', None)
                 form.base_fields['comment'].widget.attrs.pop('readonly', None)
-                logger.info(f"Enabled comment field for {request.user.username}")
+                logger.debug("Enabled comment field for %s", request.user.username)
         
         return form
 
+    def get_changelist(self, request, **kwargs):
+        return DailyReportChangeList
+
     def get_queryset(self, request):
-        qs = super().get_queryset(request)
+        # 一覧の「ユーザー」列や __str__ でユーザーを1件ずつ取得しないようにする
+        qs = super().get_queryset(request).select_related('user')
         # スーパーユーザーは全ての日報を閲覧可能
-        if request.user.is_superuser:
-            return qs
-        
         # リーダーグループに所属するユーザーは自分の所属グループのメンバーの日報のみ閲覧可能
-        if request.user.groups.filter(name='リーダー').exists():
-            # ユーザーの所属グループを取得
-            user_groups = request.user.groups.all().exclude(name='リーダー')
-            if user_groups.exists():
-                # 所属グループがある場合は、そのグループのメンバーの日報のみ表示
-                users_in_same_groups = User.objects.filter(groups__in=user_groups).distinct()
-                return qs.filter(user__in=users_in_same_groups)
-            else:
-                # リーダー以外の所属グループがない場合は、自分の日報のみ
-                return qs.filter(user=request.user)
-                
+        # （リーダー以外の所属グループがない場合は自分の日報のみ）
         # それ以外のユーザーは自分の日報のみ閲覧可能
-        return qs.filter(user=request.user)
+        return get_roles(request).scope_reports(qs)
+
+    def get_search_results(self, request, queryset, search_term):
+        # 全文検索インデックスがあれば、作業詳細と結合せずにインデックスから日報を絞り込む
+        if not search_term or not search.is_available(queryset.db):
+            return super().get_search_results(request, queryset, search_term)
+        for term in search.split_terms(search_term):
+            queryset = queryset.filter(
+                search.term_condition(term) | Q(user__username__icontains=term)
+            )
+        return queryset, False
 
     def has_view_permission(self, request, obj=None):
+        roles = get_roles(request)
         # スーパーユーザーは全ての日報を閲覧可能
-        if request.user.is_superuser:
+        if roles.is_superuser:
             return True
             
         # objがNoneの場合はリストビュー - get_querysetが適切にフィルタリングするので許可
         if obj is None:
             return True
             
-        # リーダーの場合は所属グループをチェック
-        if request.user.groups.filter(name='リーダー').exists():
-            # 自分の日報は閲覧可能
-            if obj.user == request.user:
-                return True
-                
-            # 自分が所属する非リーダーグループを取得
-            user_groups = request.user.groups.all().exclude(name='リーダー')
-            if not user_groups.exists():
-                return False
-                
-            # 対象ユーザーが自分の所属グループに含まれるかチェック
-            return obj.user.groups.filter(id__in=user_groups).exists()
-            
-        # それ以外のユーザーは自分の日報のみ閲覧可能
-        return obj.user == request.user
+        # 自分の日報、またはリーダーの場合は所属グループのメンバーの日報のみ閲覧可能
+        return roles.can_view_report(obj)
 
     def has_change_permission(self, request, obj=None):
         # has_view_permissionと同じロジックを使用
@@ -242,30 +266,15 @@ class DailyReportAdmin(admin.ModelAdmin):
 
     def has_delete_permission(self, request, obj=None):
         # スーパーユーザーまたはリーダーグループのみ削除可能
-        if request.user.is_superuser:
-            return True
-        if request.user.groups.filter(name='リーダー').exists():
-            return True
-        return False
+        return get_roles(request).can_confirm
 
     def custom_boss_confirmation(self, obj):
-        is_superuser = self.request.user.is_superuser
-        is_leader = self.request.user.groups.filter(name='リーダー').exists()
-        can_edit = False
-        
-        # スーパーユーザーは全ての日報を編集可能
-        if is_superuser:
-            can_edit = True
-        # リーダーの場合、自分のグループのメンバーの日報のみ編集可能
-        elif is_leader:
-            # 自分の日報は編集可能
-            if obj.user == self.request.user:
-                can_edit = True
-            else:
-                # 自分のグループに属するユーザーの日報のみ編集可能
-                user_groups = self.request.user.groups.all().exclude(name='リーダー')
-                if user_groups.exists() and obj.user.groups.filter(id__in=user_groups).exists():
-                    can_edit = True
+        # 一覧では DailyReportChangeList が付与した can_edit を使う
+        can_edit = getattr(obj, 'can_edit', None)
+        if can_edit is None:
+            roles = get_roles(self.request)
+            # スーパーユーザーは全ての日報、リーダーは自分と自分のグループのメンバーの日報のみ編集可能
+            can_edit = roles.can_confirm and roles.can_view_report(obj)
         
         # リーダーまたはスーパーユーザーで編集権限がある場合は編集可能なチェックボックスを表示
         if can_edit:
@@ -282,6 +291,11 @@ class DailyReportAdmin(admin.ModelAdmin):
             return '✓' if obj.boss_confirmation else '✗'
     custom_boss_confirmation.short_description = '上司確認'
 
+    @admin.action(description='選択した日報をCSVでエクスポート')
+    def export_selected_csv(self, request, queryset):
+        # 一覧の絞り込み・閲覧範囲（get_queryset）が適用済みのクエリセットをそのまま出力する
+        return report_csv_response(queryset.order_by('-date', 'id'))
+
     def get_username(self, obj):
         return obj.user.username if obj.user else "未設定"
     get_username.short_description = 'ユーザー'
@@ -291,12 +305,35 @@ class DailyReportAdmin(admin.ModelAdmin):
         return ", ".join(titles) if titles else "-"
     get_work_titles.short_description = '作業内容'
 
-    def save_model(self, request, obj, form, change):
-        submitting = '_save_submit' in request.POST
-        drafting   = '_save_draft'  in request.POST
+    def change_view(self, request, object_id, form_url='', extra_context=None):
+        # 日報が前回の表示から変わっていなければ、フォームを描画せずに 304 を返す
+        def version():
+            if not str(object_id).isdigit():
+                return None
+            return conditional.queryset_version(request, self.get_queryset(request).filter(pk=object_id))
+
+        render = super().change_view
+        return conditional.respond(
+            request, version, lambda: render(request, object_id, form_url, extra_context), never_cache=True,
+        )
+
+    @csrf_protect_m
+    def changeform_view(self, request, object_id=None, form_url='', extra_context=None):
+        # 画面の表示（GET）は読み込みだけなので、書き込みロックを取るのは保存（POST）のときだけにする
+        atomic = write_atomic if request.method == 'POST' else transaction.atomic
+        with atomic(using=router.db_for_write(self.model)):
+            return self._changeform_view(request, object_id, form_url, extra_context)
+
+    @csrf_protect_m
+    def delete_view(self, request, object_id, extra_context=None):
+        # 確認画面の表示（GET）は読み込みだけなので、書き込みロックを取るのは削除（POST）のときだけにする
+        atomic = write_atomic if request.method == 'POST' else transaction.atomic
+        with atomic(using=router.db_for_write(self.model)):
+            return self._delete_view(request, object_id, extra_context)
 
+    def save_model(self, request, obj, form, change):
         # is_submitted をボタンで決定（提出ボタンが押された場合のみ変更）
-        if submitting:
+        if '_save_submit' in request.POST:
             obj.is_submitted = True
         # 通常の保存の場合は、既存の提出状態を保持（変更しない）
 
@@ -306,51 +343,94 @@ class DailyReportAdmin(admin.ModelAdmin):
         if not change:
             obj.user = request.user
 
-        # まず保存
         super().save_model(request, obj, form, change)
 
-        # ボタンに応じてメール & メッセージ
+    def save_related(self, request, form, formsets, change):
+        obj = form.instance
+        submitting = '_save_submit' in request.POST
+
+        # 作業詳細を保存してから通知メールを作るので、メールに今回の作業詳細が載る
+        # （日報・作業詳細・通知メールは changeform_view の同じトランザクションで書き込まれる）
+        super().save_related(request, form, formsets, change)
+        recipient_emails = self.send_notification_email(request.user, obj) if submitting else None
+
+        # ボタンに応じてメッセージ
         if submitting:
-            recipient_emails = self.send_notification_email(request.user, obj)
             if recipient_emails:
                 email_list = ", ".join(recipient_emails)
-                messages.success(request, f"日報が提出されました。メールを送信しました: {email_list}")
+                messages.success(request, f"日報が提出されました。メールの送信を予約しました: {email_list}")
             else:
                 messages.success(request, "日報が提出されました。（メールアドレスが設定されていないためメールは送信されませんでした）")
         else:
             messages.info(request, "下書きを保存しました")
 
+    def save_formset(self, request, form, formset, change):
+        """作業詳細を、変更のあった行だけまとめて保存する
+
+        新しい行は1回の bulk_create、変更された行は変更された項目だけを1回の bulk_update で保存する。
+        変更のない行（初期値のまま残した行を含む）は保存しない。
+        """
+        if formset.model is not DailyReportDetail:
+            return super().save_formset(request, form, formset, change)
+
+        model_fields = {field.name for field in DailyReportDetail._meta.concrete_fields}
+        new_objects = []
+        changed_objects = []
+        changed_fields = set()
+        deleted_objects = []
+        for detail_form in formset.initial_forms + formset.extra_forms:
+            if formset.can_delete and detail_form in formset.deleted_forms:
+                if detail_form.instance.pk is not None:
+                    deleted_objects.append(detail_form.instance)
+                continue
+            if not detail_form.has_changed():
+                continue
+            detail = detail_form.save(commit=False)
+            if detail_form in formset.extra_forms:
+                setattr(detail, formset.fk.name, formset.instance)
+                new_objects.append(detail)
+            else:
+                fields = [name for name in detail_form.changed_data if name in model_fields]
+                changed_objects.append((detail, fields))
+                changed_fields.update(fields)
+
+        if deleted_objects:
+            DailyReportDetail.objects.filter(pk__in=[detail.pk for detail in deleted_objects]).delete()
+        if new_objects:
+            DailyReportDetail.objects.bulk_create(new_objects)
+        if changed_objects:
+            DailyReportDetail.objects.bulk_update(
+                [detail for detail, _ in changed_objects], sorted(changed_fields)
+            )
+        if new_objects or changed_objects:
+            # bulk_create / bulk_update ではシグナルが送られないため、集計とキャッシュを明示的に更新する
+            report = formset.instance
+            summaries.mark_dirty(report.user_id, report.date)
+            caching.bump_version_on_commit(caching.REPORTS)
+
+        # 変更履歴（LogEntry）のメッセージ用
+        formset.new_objects = new_objects
+        formset.changed_objects = changed_objects
+        formset.deleted_objects = deleted_objects
+
     def send_notification_email(self, user, report):
-        """日報が保存されたことを通知するメールを送信する"""
+        """日報が保存されたことを通知するメールを送信キューに登録する
+
+        実際の送信は send_queued_mail コマンドが行うため、リクエスト中にSMTPを待たない。
+        """
         subject = f"日報保存通知: {user.username} - {report.date}"
         
-        # 作業内容を取得 - より直接的な方法で取得
-        work_details = []
-        
-        # 日報に関連する詳細をすべて取得 - より確実な方法で
-        detail_records = DailyReportDetail.objects.filter(report=report)
-        
-        if detail_records.exists():
-            for detail in detail_records:
+        # 作業詳細はデバッグ用のログにのみ出力するため、DEBUGが有効なときだけ取得する
+        if logger.isEnabledFor(logging.DEBUG):
+            work_details = []
+            for detail in DailyReportDetail.objects.filter(report=report):
                 # 各フィールドを個別に処理
                 start_time_str = str(detail.start_time) if detail.start_time else "未記入"
                 end_time_str = str(detail.end_time) if detail.end_time else "未記入"
                 work_title_str = detail.work_title if detail.work_title else "未記入"
                 responsible_person_str = detail.responsible_person if detail.responsible_person else "-"
-                
-                # 必ず情報を追加
-                entry = f"{start_time_str}〜{end_time_str}: {work_title_str} (担当: {responsible_person_str})"
-                work_details.append(entry)
-                logger.info(f"メール作業詳細に追加: {entry}")
-        else:
-            # 詳細レコードがない場合
-            work_details.append("作業詳細はありません")
-            logger.info("作業詳細レコードが見つかりませんでした")
-        
-        # デバッグ情報としてログに出力
-        logger.info(f"作業詳細件数: {len(work_details)}")
-        for i, detail in enumerate(work_details):
-            logger.info(f"詳細 {i+1}: {detail}")
+                work_details.append(f"{start_time_str}〜{end_time_str}: {work_title_str} (担当: {responsible_person_str})")
+            logger.debug("メール作業詳細: 日報ID=%s %s件 %s", report.id, len(work_details), work_details or "作業詳細はありません")
         
         # 日報へのURLを作成
         report_url = f"/admin/report/dailyreport/{report.id}/change/"
@@ -390,7 +470,7 @@ class DailyReportAdmin(admin.ModelAdmin):
         message += f"\n【報告事項】\n{report.remarks or 'なし'}\n"
         
         # メール送信用のデバッグログ
-        logger.info(f"作成されたメール本文:\n{message}")
+        logger.debug("作成されたメール本文:\n%s", message)
         
         from_email = settings.EMAIL_HOST_USER
         
@@ -412,84 +492,116 @@ class DailyReportAdmin(admin.ModelAdmin):
         # EMAIL_NOTIFICATIONの設定は使用しない
         
         if recipient_emails:  # メールアドレスが設定されている場合のみ送信
-            try:
-                send_mail(subject, message, from_email, recipient_emails)
-                logger.info(f"メール送信成功: {recipient_emails}")
-            except Exception as e:
-                logger.error(f"メール送信エラー: {e}")
+            # 日報の保存と同じトランザクションで送信キューに登録する
+            enqueue_email(subject, message, from_email, recipient_emails)
+            logger.info("メール送信を予約: %s", recipient_emails)
         
         return recipient_emails  # 送信先メールアドレスリストを返す
 
-    # リクエストオブジェクトを保存するためのミドルウェア
     def changelist_view(self, request, extra_context=None):
+        # 日報・ユーザーのキャッシュの世代と絞り込み条件（URL）が前回と同じなら、一覧を描画せずに 304 を返す
+        # （表示のたびに全件の COUNT・MAX(updated_at) を数えない）
+        return conditional.respond(
+            request,
+            lambda: conditional.cache_version(request),
+            lambda: self.render_changelist(request, extra_context),
+            never_cache=True,
+        )
+
+    # リクエストオブジェクトを保存するためのミドルウェア
+    def render_changelist(self, request, extra_context=None):
         self.request = request
         
         # POSTリクエストの場合、チェックボックスの変更を処理
         if request.method == 'POST':
-            can_edit = request.user.is_superuser
-            is_leader = request.user.groups.filter(name='リーダー').exists()
-            
-            if is_leader or can_edit:
-                for key in list(request.POST.keys()):
-                    if key.startswith('boss_confirmation_'):
-                        try:
-                            report_id = int(key.split('_')[-1])
-                            report = DailyReport.objects.get(id=report_id)
-                            
-                            # リーダーの場合、自分のグループのメンバーの日報のみ編集可能
-                            if is_leader and not can_edit:
-                                user_groups = request.user.groups.all().exclude(name='リーダー')
-                                if not report.user.groups.filter(id__in=user_groups).exists() and report.user != request.user:
-                                    continue  # 自分のグループ外のユーザーの日報は編集不可
-                            
-                            # チェックされていればTrue、そうでなければFalse
-                            report.boss_confirmation = True
-                            report.save()
-                        except (ValueError, DailyReport.DoesNotExist):
-                            pass
-                            
-                    # チェックボックスが外された場合の処理
-                    elif key.startswith('_boss_confirmation_'):
-                        try:
-                            report_id = int(key.split('_')[-1])
-                            # 対応するチェックボックスがPOSTデータに存在しない場合はFalseにする
-                            checkbox_key = 'boss_confirmation_' + str(report_id)
-                            if checkbox_key not in request.POST:
-                                report = DailyReport.objects.get(id=report_id)
-                                
-                                # リーダーの場合、自分のグループのメンバーの日報のみ編集可能
-                                if is_leader and not can_edit:
-                                    user_groups = request.user.groups.all().exclude(name='リーダー')
-                                    if not report.user.groups.filter(id__in=user_groups).exists() and report.user != request.user:
-                                        continue  # 自分のグループ外のユーザーの日報は編集不可
-                                
-                                report.boss_confirmation = False
-                                report.save()
-                        except (ValueError, DailyReport.DoesNotExist):
-                            pass
+            self.apply_boss_confirmations(request)
         
         extra_context = extra_context or {}
         extra_context['import_csv_url'] = reverse('admin:import_csv')
         return super().changelist_view(request, extra_context=extra_context)
 
+    def apply_boss_confirmations(self, request):
+        """一覧の上司確認チェックボックスのうち、実際に変更された日報だけをまとめて更新する"""
+        roles = get_roles(request)
+        if not roles.can_confirm:
+            return
+        
+        # 日報ID -> 送信された上司確認の状態
+        # チェックされていれば boss_confirmation_<id>、外されていれば hidden の _boss_confirmation_<id> のみが送られる
+        requested = {}
+        for key in request.POST.keys():
+            if key.startswith('boss_confirmation_'):
+                checked = True
+            elif key.startswith('_boss_confirmation_'):
+                checked = False
+            else:
+                continue
+            try:
+                report_id = int(key.split('_')[-1])
+            except ValueError:
+                continue
+            requested[report_id] = requested.get(report_id, False) or checked
+        if not requested:
+            return
+        
+        # 権限のある日報の現在の状態を1クエリで取得（リーダーは自分のグループのメンバーの日報のみ）
+        current = dict(
+            roles.scope_reports(DailyReport.objects.filter(id__in=requested))
+            .values_list('id', 'boss_confirmation')
+        )
+        to_confirm = [pk for pk, confirmed in current.items() if requested[pk] and not confirmed]
+        to_unconfirm = [pk for pk, confirmed in current.items() if not requested[pk] and confirmed]
+        if not to_confirm and not to_unconfirm:
+            return
+        
+        # 変更のあった日報だけを、boss_confirmation と updated_at のみ更新する
+        now = timezone.now()
+        with write_atomic():
+            confirmed_count = DailyReport.objects.filter(
+                id__in=to_confirm, boss_confirmation=False
+            ).update(boss_confirmation=True, updated_at=now) if to_confirm else 0
+            unconfirmed_count = DailyReport.objects.filter(
+                id__in=to_unconfirm, boss_confirmation=True
+            ).update(boss_confirmation=False, updated_at=now) if to_unconfirm else 0
+            # update() ではシグナルが送られないため、一覧のキャッシュを明示的に無効にする
+            caching.bump_version_on_commit(caching.REPORTS)
+        
+        logger.info(
+            '上司確認を更新: user=%s 確認 %s件 %s / 取消 %s件 %s',
+            request.user.username, confirmed_count, to_confirm, unconfirmed_count, to_unconfirm,
+        )
+
     list_per_page = 20
     # list_editable = ['boss_confirmation']  # カスタムフィールドに置き換えたので不要
 
     def get_readonly_fields(self, request, obj=None):
         # デバッグ情報
-        is_superuser = request.user.is_superuser
-        is_leader = request.user.groups.filter(name='リーダー').exists()
-        logger.info(f"User: {request.user.username}, Superuser: {is_superuser}, Leader: {is_leader}")
+        roles = get_roles(request)
+        logger.debug("User: %s, Superuser: %s, Leader: %s",
+                     request.user.username, roles.is_superuser, roles.is_leader)
         
         readonly = list(self.readonly_fields)
         # リーダーグループに属していない場合、boss_confirmationとcommentを読み取り専用にする
-        if not is_superuser and not is_leader:
+        if not roles.can_confirm:
             readonly.extend(['boss_confirmation', 'comment'])
-            logger.info(f"Setting readonly fields for {request.user.username}: {readonly}")
+            logger.debug("Setting readonly fields for %s: %s", request.user.username, readonly)
         return readonly
 
     def get_urls(self):
         urls = super().get_urls()
+        # 一覧と変更画面は ETag で 304 を返すため、ブラウザに保存させないヘッダー（never_cache）を付けずに登録し直す
+        # （304 にならない場合のヘッダーは conditional.respond で付ける）
+        info = self.opts.app_label, self.opts.model_name
+        cacheable_views = {
+            '%s_%s_changelist' % info: self.changelist_view,
+            '%s_%s_change' % info: self.change_view,
+        }
+        for i, pattern in enumerate(urls):
+            view = cacheable_views.get(getattr(pattern, 'name', None))
+            if view:
+                wrapped = self.admin_site.admin_view(view, cacheable=True)
+                wrapped.model_admin = self
+                urls[i] = path(str(pattern.pattern), wrapped, name=pattern.name)
         custom_urls = [
             path('import-csv/', self.admin_site.admin_view(self.import_csv_view), name='import_csv'),
         ]
@@ -498,6 +610,29 @@ class DailyReportAdmin(admin.ModelAdmin):
     def import_csv_view(self, request):
         return HttpResponseRedirect('/import/csv/')
 
+# 送信メールキューの管理画面設定
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'recipients', 'status', 'attempts', 'created_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('subject', 'recipients')
+    readonly_fields = ('created_at', 'sent_at', 'last_error')
+    actions = ['retry_emails']
+    
+    def has_module_permission(self, request):
+        return request.user.is_superuser
+    
+    def has_view_permission(self, request, obj=None):
+        return request.user.is_superuser
+    
+    @admin.action(description='選択したメールを再送する')
+    def retry_emails(self, request, queryset):
+        # 送信中のメールはワーカーが送っている最中のため戻さない（二重送信になる）
+        count = queryset.exclude(status__in=[OutboundEmail.STATUS_SENT, OutboundEmail.STATUS_SENDING]).update(
+            status=OutboundEmail.STATUS_PENDING, attempts=0, next_attempt_at=timezone.now()
+        )
+        messages.success(request, f"{count}件のメールを送信待ちに戻しました。")
+
 # UserProfileの管理画面設定
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
@@ -4,3 +4,21 @@ from django.apps import AppConfig
 class ReportConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'report'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_migrate
+
+        # 集計テーブルなどを更新するシグナルを登録
+        from . import signals  # noqa: F401
+        from .cachestore import ensure_cache_table
+        from .db import configure_sqlite_connection
+        from .search import ensure_search_index
+
+        # SQLiteの接続ごとに PRAGMA（WALなど）を設定する
+        connection_created.connect(configure_sqlite_connection, dispatch_uid='report_sqlite_pragmas')
+
+        # マイグレーションでテーブルが作り直されると全文検索のトリガーが消えるため、作成し直す
+        post_migrate.connect(ensure_search_index, sender=self, dispatch_uid='report_search_index')
+        # キャッシュのテーブル（cache.sqlite3）は migrate で作られないため、ここで作成する
+        post_migrate.connect(ensure_cache_table, sender=self, dispatch_uid='report_cache_table')
@@ -0,0 +1,128 @@
+import os
+import threading
+from collections import defaultdict
+
+from django.core.cache import caches
+from django.core.cache.backends.db import BaseDatabaseCache, DatabaseCache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.management import call_command
+from django.db import connections, router
+
+_MISSING = object()
+
+
+class CacheStats:
+    """キャッシュの読み込みのヒット・ミスを、キーの種類ごとにプロセス内で数える"""
+
+    def __init__(self):
+        self._counts = defaultdict(lambda: {'hits': 0, 'misses': 0})
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def group(key):
+        # report:filter:users:<世代>:<ハッシュ> → report:filter、セッションは sessions にまとめる
+        if key.startswith('django.contrib.sessions'):
+            return 'sessions'
+        parts = key.split(':')
+        return ':'.join(parts[:2]) if parts[0] == 'report' else parts[0]
+
+    def record(self, key, hit):
+        with self._lock:
+            self._counts[self.group(key)]['hits' if hit else 'misses'] += 1
+
+    def summary(self):
+        """キーの種類ごとのヒット数・ミス数・ヒット率を、読み込みの多い順に返す"""
+        with self._lock:
+            counts = {group: dict(count) for group, count in self._counts.items()}
+        rows = []
+        for group, count in counts.items():
+            total = count['hits'] + count['misses']
+            rows.append({'group': group, **count, 'total': total, 'hit_rate': count['hits'] / total * 100})
+        rows.sort(key=lambda row: row['total'], reverse=True)
+        return rows
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+
+
+stats = CacheStats()
+
+
+class StatsDatabaseCache(DatabaseCache):
+    """ヒット率を数える DatabaseCache（get も get_many を経由する）"""
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        values = super().get_many(keys, version)
+        for key in keys:
+            stats.record(key, key in values)
+        return values
+
+
+class StatsFileBasedCache(FileBasedCache):
+    """ヒット率を数える FileBasedCache（get_many も get を経由する）"""
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _MISSING, version)
+        stats.record(key, value is not _MISSING)
+        return default if value is _MISSING else value
+
+
+def ensure_cache_table(sender, verbosity=1, **kwargs):
+    """post_migrate シグナル: DatabaseCache のテーブルがなければ作成する（cache データベースを含む）"""
+    for alias in connections:
+        call_command('createcachetable', database=alias, verbosity=verbosity)
+
+
+def backend_info(alias='default'):
+    """キャッシュの種類・保存先・件数・サイズ"""
+    cache = caches[alias]
+    info = {'backend': type(cache).__name__, 'location': None, 'entries': None, 'size': None}
+    if isinstance(cache, BaseDatabaseCache):
+        db = router.db_for_read(cache.cache_model_class)
+        connection = connections[db]
+        info['location'] = f'{connection.settings_dict["NAME"]}（{cache._table}）'
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM {connection.ops.quote_name(cache._table)}')
+            info['entries'] = cursor.fetchone()[0]
+        if connection.vendor == 'sqlite' and os.path.exists(connection.settings_dict['NAME']):
+            info['size'] = os.path.getsize(connection.settings_dict['NAME'])
+    elif isinstance(cache, FileBasedCache):
+        info['location'] = cache._dir
+        files = cache._list_cache_files()
+        info['entries'] = len(files)
+        info['size'] = sum(os.path.getsize(path) for path in files if os.path.exists(path))
+    return info
+
+
+def warm_changelists(users=None):
+    """日報一覧のキャッシュ（件数・ページ境界・絞り込みの選択肢・日付の一覧）を作る
+
+    users を省略した場合は、スーパーユーザー1人（全件の範囲）とリーダー全員の閲覧範囲で作る。
+    """
+    # このモジュールは CACHES の BACKEND としてアプリの読み込み前にも import されるため、ここで import する
+    from django.contrib import admin
+    from django.contrib.auth.models import User
+    from django.test import RequestFactory
+    from django.urls import reverse
+
+    from .models import DailyReport
+    from .roles import LEADER_GROUP
+    from .templatetags.report_admin import cached_date_hierarchy
+
+    if users is None:
+        users = list(User.objects.filter(is_superuser=True, is_active=True).order_by('id')[:1])
+        users += User.objects.filter(
+            groups__name=LEADER_GROUP, is_superuser=False, is_active=True, is_staff=True,
+        ).order_by('id')
+    model_admin = admin.site._registry[DailyReport]
+    factory = RequestFactory()
+    url = reverse('admin:report_dailyreport_changelist')
+    for user in users:
+        request = factory.get(url)
+        request.user = user
+        # ChangeList の作成で件数・先頭ページ・絞り込みの選択肢が、日付の表示で日付の一覧がキャッシュされる
+        changelist = model_admin.get_changelist_instance(request)
+        cached_date_hierarchy(changelist)
+    return users
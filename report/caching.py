@@ -0,0 +1,66 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+# キャッシュの世代を管理する名前空間
+# 日報・作業詳細の変更で REPORTS、ユーザー・グループの変更で USERS を更新する
+REPORTS = 'reports'
+USERS = 'users'
+
+
+def get_timeout():
+    return getattr(settings, 'REPORT_CACHE_SECONDS', 300)
+
+
+def _version_key(namespace):
+    return f'report:version:{namespace}'
+
+
+def get_version(namespace):
+    """名前空間の現在の世代（データが変わるたびに新しい値になる）"""
+    key = _version_key(namespace)
+    version = cache.get(key)
+    if version is None:
+        # キャッシュから消えた場合も、以前と重ならない値で始める
+        version = time.time_ns()
+        cache.add(key, version, None)
+        version = cache.get(key, version)
+    return version
+
+
+def get_versions(*namespaces):
+    """複数の名前空間の世代をまとめて取得する（共有キャッシュへの問い合わせを1回にする）"""
+    found = cache.get_many([_version_key(namespace) for namespace in namespaces])
+    return [
+        found[_version_key(namespace)] if _version_key(namespace) in found else get_version(namespace)
+        for namespace in namespaces
+    ]
+
+
+def bump_version(*namespaces):
+    """名前空間の世代を進め、その名前空間のキャッシュをすべて無効にする"""
+    cache.set_many({_version_key(namespace): time.time_ns() for namespace in namespaces}, None)
+
+
+def bump_version_on_commit(*namespaces):
+    """トランザクションのコミット後に世代を進める
+
+    コミット前に進めると、別スレッドが変更前のデータを新しい世代でキャッシュしてしまう。
+    """
+    transaction.on_commit(lambda: bump_version(*namespaces), robust=True)
+
+
+def make_key(prefix, *parts, namespaces=(REPORTS,)):
+    """世代を含むキャッシュキーを作る（parts は SQL やユーザーIDなど、内容を決める値）"""
+    versions = ':'.join(str(version) for version in get_versions(*namespaces))
+    digest = hashlib.md5(repr(parts).encode('utf-8')).hexdigest()
+    return f'report:{prefix}:{versions}:{digest}'
+
+
+def queryset_fingerprint(queryset):
+    """クエリセットのSQLとパラメーター（キャッシュキーの材料）"""
+    sql, params = queryset.query.sql_with_params()
+    return (queryset.db, sql, tuple(params))
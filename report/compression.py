@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.middleware.gzip import GZipMiddleware
+
+# 圧縮済みのため gzip しない Content-Type（前方一致）
+DEFAULT_EXCLUDED_CONTENT_TYPES = (
+    'image/png', 'image/jpeg', 'image/gif', 'image/webp',
+    'audio/', 'video/', 'font/woff',
+    'application/zip', 'application/gzip', 'application/x-gzip', 'application/pdf',
+    # xlsx などの Office ファイルは中身が zip
+    'application/vnd.openxmlformats-officedocument.',
+)
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """ブラウザが対応していればレスポンスを gzip で圧縮する
+
+    Django の GZipMiddleware に、圧縮する最小サイズと対象外の Content-Type の設定を加えたもの。
+    ストリーミングのレスポンス（CSVエクスポートなど）は、全体を溜めずにチャンクごとに圧縮して送る。
+    GZIP_ENABLED が無効なら MiddlewareNotUsed で外れる。
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'GZIP_ENABLED', True):
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        self.min_length = getattr(settings, 'GZIP_MIN_LENGTH', 1024)
+        self.excluded_content_types = tuple(
+            content_type.lower()
+            for content_type in getattr(settings, 'GZIP_EXCLUDED_CONTENT_TYPES', DEFAULT_EXCLUDED_CONTENT_TYPES)
+        )
+
+    def process_response(self, request, response):
+        content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        if content_type.startswith(self.excluded_content_types):
+            return response
+        # 小さいレスポンスは圧縮しても転送量がほとんど減らない（ストリーミングは長さが分かる場合のみ判定する）
+        if response.streaming:
+            length = response.get('Content-Length')
+            if length and length.isdigit() and int(length) < self.min_length:
+                return response
+        elif len(response.content) < self.min_length:
+            return response
+        return super().process_response(request, response)
@@ -0,0 +1,77 @@
+import hashlib
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.db.models import Count, Max
+from django.utils.cache import add_never_cache_headers, get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from . import caching
+
+
+def data_version(queryset, field='updated_at'):
+    """絞り込み後の行の件数と最終更新日時（一覧・エクスポートの内容が変わったかの目安）"""
+    return queryset.order_by().aggregate(last_modified=Max(field), count=Count('pk'))
+
+
+def make_etag(request, *parts, namespaces=(caching.REPORTS, caching.USERS)):
+    """閲覧者・URL・データの世代から ETag を作る
+
+    画面にはユーザー名やCSRFトークン、ハッシュ付きの静的ファイル名も含まれるため、それらも材料にする。
+    """
+    material = (
+        request.user.pk,
+        request.get_full_path(),
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME),
+        getattr(staticfiles_storage, 'manifest_hash', ''),
+        *caching.get_versions(*namespaces),
+        *parts,
+    )
+    return '"%s"' % hashlib.sha1(repr(material).encode('utf-8')).hexdigest()
+
+
+def queryset_version(request, queryset, *parts):
+    """クエリセットの件数・最終更新日時を含む (ETag, 最終更新日時) を返す"""
+    version = data_version(queryset)
+    return make_etag(request, version['last_modified'], version['count'], *parts), version['last_modified']
+
+
+def cache_version(request, *parts):
+    """キャッシュの世代だけから (ETag, None) を返す（データベースには問い合わせない）
+
+    日報・ユーザーの変更では必ず世代が進むため、件数の多い一覧でも COUNT や MAX を数えずに判定できる。
+    """
+    return make_etag(request, *parts), None
+
+
+def respond(request, get_version, render, never_cache=False):
+    """前回と同じ内容なら描画せずに 304 を返し、そうでなければ render() のレスポンスに ETag を付ける
+
+    get_version() は (ETag, 最終更新日時) を返す（ETag が None なら通常どおり描画する）。
+    POST や、表示待ちのメッセージがある場合は対象外。
+    """
+    version = None
+    if request.method in ('GET', 'HEAD') and not len(get_messages(request)):
+        version = get_version()
+    if version is None or version[0] is None:
+        response = render()
+        if never_cache:
+            add_never_cache_headers(response)
+        return response
+
+    etag, last_modified = version
+    # 日報の削除では最終更新日時が変わらないため、判定は ETag だけで行う（Last-Modified は参考として返す）
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = render()
+        if response.status_code != 200:
+            if never_cache:
+                add_never_cache_headers(response)
+            return response
+    response.headers['ETag'] = etag
+    if last_modified:
+        response.headers['Last-Modified'] = http_date(last_modified.timestamp())
+    # ブラウザに保存させ、表示のたびに If-None-Match で確認させる
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
@@ -0,0 +1,100 @@
+import logging
+import re
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+# PRAGMAに渡せる値（数値・キーワードのみ）
+_PRAGMA_VALUE = re.compile(r'^-?[A-Za-z0-9_]+$')
+
+
+def get_sqlite_pragmas():
+    return getattr(settings, 'SQLITE_PRAGMAS', {})
+
+
+def apply_sqlite_pragmas(dbapi_connection, pragmas):
+    """sqlite3 の接続に PRAGMA をまとめて設定する"""
+    statements = []
+    for name, value in pragmas.items():
+        if value is None or value == '':
+            continue
+        value = str(value)
+        if not _PRAGMA_VALUE.match(name) or not _PRAGMA_VALUE.match(value):
+            logger.warning('不正なPRAGMA設定を無視しました: %s=%s', name, value)
+            continue
+        statements.append(f'PRAGMA {name}={value}')
+    if not statements:
+        return
+    cursor = dbapi_connection.cursor()
+    try:
+        for statement in statements:
+            cursor.execute(statement)
+    finally:
+        cursor.close()
+
+
+def configure_sqlite_connection(sender, connection, **kwargs):
+    """connection_created シグナル: SQLiteの接続ごとに PRAGMA を設定する
+
+    journal_mode=WAL にすると一覧の読み込みと日報の保存が互いにブロックしなくなる。
+    """
+    if connection.vendor != 'sqlite':
+        return
+    apply_sqlite_pragmas(connection.connection, get_sqlite_pragmas())
+
+
+@contextmanager
+def write_atomic(using=None):
+    """書き込みを行う transaction.atomic()（SQLite では開始時に書き込みロックを取得する）
+
+    既定の DEFERRED では、読み込みの後に書き込もうとした時点で別の書き込みがコミット済みだと
+    待たずに "database is locked" になる。書き込むことが分かっている処理だけ BEGIN IMMEDIATE にし、
+    画面の表示などの読み込みだけのトランザクションは書き込みロックを待たないようにする。
+    外側のトランザクションの中で呼ばれた場合は、そのトランザクションに参加する。
+    """
+    connection = transaction.get_connection(using)
+    if connection.vendor != 'sqlite' or connection.in_atomic_block:
+        with transaction.atomic(using=using):
+            yield
+        return
+
+    # transaction_mode は接続時に設定から読み込まれるため、接続してから切り替える
+    connection.ensure_connection()
+    previous = connection.transaction_mode
+    connection.transaction_mode = 'IMMEDIATE'
+    try:
+        with transaction.atomic(using=using):
+            connection.transaction_mode = previous
+            yield
+    finally:
+        connection.transaction_mode = previous
+
+
+def on_commit_batch(name, flush, items, using=None):
+    """items をトランザクションごとに溜め、コミット後に flush(溜めた値の set) を1回だけ呼ぶ
+
+    溜めた値は登録したコールバックが持つため、ロールバックされるとコールバックと一緒に捨てられ、
+    次のトランザクションに持ち越されない。まとめるのは同じセーブポイントの中で登録した分だけにし、
+    内側の atomic だけがロールバックされた場合もその分だけが捨てられるようにする。
+    トランザクションの外で呼ばれた場合はすぐに flush する。flush の失敗で保存をエラーにしない（robust）。
+    """
+    connection = transaction.get_connection(using)
+    savepoint_ids = set(connection.savepoint_ids)
+    for sids, callback, _ in connection.run_on_commit:
+        if sids == savepoint_ids and getattr(callback, 'batch_name', None) == name:
+            callback.items.update(items)
+            return
+
+    pending = set(items)
+
+    def callback():
+        # 実行済みのコールバックには追加しない
+        callback.batch_name = None
+        flush(pending)
+
+    callback.batch_name = name
+    callback.items = pending
+    transaction.on_commit(callback, using=using, robust=True)
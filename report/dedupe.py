@@ -0,0 +1,73 @@
+from django.db.models import Count
+
+
+def _merge_text(values):
+    """空でない文字列を重複なく改行でつなぐ"""
+    merged = []
+    for value in values:
+        if value and value not in merged:
+            merged.append(value)
+    return '\n'.join(merged) or None
+
+
+def merge_duplicate_reports(report_model, detail_model, dry_run=False):
+    """同じ (ユーザー, 日付) の日報が複数ある場合に1件へまとめる
+
+    残す日報は 提出済み > 上司確認済み > 更新日時が新しい > id が小さい の順で選ぶ。
+    他の日報の作業詳細は残す日報へ移し（同じ内容の詳細は削除）、
+    報告事項・コメントはつなげ、提出・上司確認はどちらかが True なら True にする。
+    マイグレーションからも呼ぶため、モデルクラスは引数で受け取る。
+
+    戻り値は (まとめた組数, 削除した日報数, 移動した作業詳細数)
+    """
+    duplicates = (
+        report_model.objects
+        .filter(user__isnull=False)
+        .values('user_id', 'date')
+        .annotate(report_count=Count('id'))
+        .filter(report_count__gt=1)
+        .order_by()
+    )
+
+    groups = 0
+    deleted_reports = 0
+    moved_details = 0
+    for duplicate in duplicates.iterator():
+        reports = list(
+            report_model.objects
+            .filter(user_id=duplicate['user_id'], date=duplicate['date'])
+            .order_by('-is_submitted', '-boss_confirmation', '-updated_at', 'id')
+        )
+        keeper, others = reports[0], reports[1:]
+        groups += 1
+        deleted_reports += len(others)
+
+        detail_fields = ('start_time', 'end_time', 'work_title', 'client', 'responsible_person')
+        existing = set(
+            detail_model.objects.filter(report_id=keeper.id).values_list(*detail_fields)
+        )
+        move_ids = []
+        drop_ids = []
+        for detail in detail_model.objects.filter(report_id__in=[r.id for r in others]).order_by('id'):
+            key = tuple(getattr(detail, field) for field in detail_fields)
+            if key in existing:
+                drop_ids.append(detail.id)
+            else:
+                existing.add(key)
+                move_ids.append(detail.id)
+        moved_details += len(move_ids)
+
+        if dry_run:
+            continue
+
+        keeper.remarks = _merge_text([r.remarks for r in reports])
+        keeper.comment = _merge_text([r.comment for r in reports])
+        keeper.is_submitted = any(r.is_submitted for r in reports)
+        keeper.boss_confirmation = any(r.boss_confirmation for r in reports)
+        keeper.save()
+
+        detail_model.objects.filter(id__in=move_ids).update(report_id=keeper.id)
+        detail_model.objects.filter(id__in=drop_ids).delete()
+        report_model.objects.filter(id__in=[r.id for r in others]).delete()
+
+    return groups, deleted_reports, moved_details
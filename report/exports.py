@@ -0,0 +1,372 @@
+import csv
+import io
+import json
+import re
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models import Exists, OuterRef, Prefetch
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .models import DailyReportDetail, ReportTombstone
+
+# 日報CSVのヘッダー
+REPORT_CSV_HEADER = [
+    '日付', 'ユーザー', '開始時間', '終了時間', '作業内容', '得意先', '担当者',
+    '報告事項', 'コメント', '上司確認', '提出状態'
+]
+
+# ユーザー情報CSVのヘッダー
+USER_CSV_HEADER = [
+    'ユーザー名', '姓', '名', 'メールアドレス', 'アクティブ', 'スタッフ権限',
+    'スーパーユーザー', 'グループ', '追加メールアドレス', '最終ログイン', '登録日'
+]
+
+
+def get_export_chunk_size():
+    """1回のクエリで読み込む日報の件数"""
+    return getattr(settings, 'REPORT_EXPORT_CHUNK_SIZE', 500)
+
+
+def report_csv_rows(report):
+    """1件の日報をCSVの行（作業詳細ごとに1行）に変換する"""
+    username = report.user.username if report.user else ''
+    confirmation = '確認済' if report.boss_confirmation else '未確認'
+    status = '提出済' if report.is_submitted else '下書き'
+
+    # prefetch済みのキャッシュを使うため all() で取得する
+    details = report.details.all()
+    if not details:
+        # 詳細がない場合は空の行を追加
+        yield [
+            report.date, username,
+            '', '', '', '', '',
+            report.remarks or '', report.comment or '',
+            confirmation, status,
+        ]
+        return
+
+    for detail in details:
+        yield [
+            report.date,
+            username,
+            detail.start_time,
+            detail.end_time,
+            detail.work_title or '',
+            detail.client or '',
+            detail.responsible_person or '',
+            report.remarks or '',
+            report.comment or '',
+            confirmation,
+            status,
+        ]
+
+
+def iter_report_rows(queryset, chunk_size=None, details_queryset=None):
+    """日報をチャンク単位で読み込み、CSVの行を順に返す
+
+    ユーザーは select_related、作業詳細はチャンクごとに prefetch するため、
+    クエリ数は日報の件数ではなくチャンク数に比例する。
+    details_queryset を渡すと、出力する作業詳細をその条件に絞り込む。
+    """
+    chunk_size = chunk_size or get_export_chunk_size()
+    if details_queryset is not None:
+        details = Prefetch('details', queryset=details_queryset)
+    else:
+        details = 'details'
+    reports = (
+        queryset
+        .select_related('user')
+        .prefetch_related(details)
+        .iterator(chunk_size=chunk_size)
+    )
+    for report in reports:
+        yield from report_csv_rows(report)
+
+
+def stream_csv(header, rows, encoding='cp932', rows_per_chunk=None):
+    """CSVの行をエンコード済みのバイト列として少しずつ返すジェネレーター
+
+    行を rows_per_chunk 件ずつバッファに書き出してから送り出すので、
+    メモリ使用量は全体の件数に関係なく一定に保たれる。
+    """
+    rows_per_chunk = rows_per_chunk or get_export_chunk_size()
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush():
+        data = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+        # ストリーミング途中で止まらないよう、変換できない文字は置き換える
+        return data.encode(encoding, errors='replace')
+
+    writer.writerow(header)
+    pending = 0
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending >= rows_per_chunk:
+            yield flush()
+            pending = 0
+    remaining = flush()
+    if remaining:
+        yield remaining
+
+
+def _parse_date(name, value):
+    """YYYY-MM-DD の日付を読み込む（空なら None、読み込めなければ ValueError）"""
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f'{name} はYYYY-MM-DD形式の日付で指定してください（{value}）') from None
+
+
+def _parse_flag(value):
+    """'1' / '0' を True / False に、それ以外は None（絞り込まない）にする"""
+    return {'1': True, '0': False}.get(value)
+
+
+def _split_values(params, name):
+    """複数指定（?user=a&user=b）とカンマ区切り（?user=a,b）の両方を受け付ける"""
+    values = []
+    for value in params.getlist(name):
+        values.extend(part.strip() for part in value.split(',') if part.strip())
+    return values
+
+
+def filter_reports(queryset, params):
+    """エクスポートの絞り込み条件（GETパラメーター）をSQLの条件として適用する
+
+    - date_from / date_to: 日付の範囲（YYYY-MM-DD）
+    - user: ユーザー名（複数可）
+    - group: グループ名（複数可。いずれかに所属するユーザーの日報）
+    - submitted / confirmed: 提出・上司確認の状態（1 または 0）
+    - client: 得意先（部分一致。該当する作業詳細のみを出力する）
+
+    戻り値は (絞り込んだ日報のクエリセット, 作業詳細のクエリセット または None)
+    日付が読み込めない場合は、全件を出力しないよう ValueError にする。
+    """
+    date_from = _parse_date('date_from', params.get('date_from'))
+    date_to = _parse_date('date_to', params.get('date_to'))
+    if date_from:
+        queryset = queryset.filter(date__gte=date_from)
+    if date_to:
+        queryset = queryset.filter(date__lte=date_to)
+
+    usernames = _split_values(params, 'user')
+    if usernames:
+        queryset = queryset.filter(user__username__in=usernames)
+
+    groups = _split_values(params, 'group')
+    if groups:
+        memberships = User.groups.through.objects.filter(
+            user_id=OuterRef('user_id'), group__name__in=groups,
+        )
+        queryset = queryset.filter(Exists(memberships))
+
+    submitted = _parse_flag(params.get('submitted'))
+    if submitted is not None:
+        queryset = queryset.filter(is_submitted=submitted)
+    confirmed = _parse_flag(params.get('confirmed'))
+    if confirmed is not None:
+        queryset = queryset.filter(boss_confirmation=confirmed)
+
+    details_queryset = None
+    client = (params.get('client') or '').strip()
+    if client:
+        details_queryset = DailyReportDetail.objects.filter(client__icontains=client)
+        queryset = queryset.filter(
+            Exists(details_queryset.filter(report_id=OuterRef('pk')))
+        )
+    return queryset, details_queryset
+
+
+def report_csv_response(queryset, details_queryset=None, filename=None):
+    """日報のクエリセットをcp932のCSVとしてストリーミングするレスポンスを返す"""
+    filename = filename or f'daily_report_{datetime.now().strftime("%Y%m%d")}.csv'
+    rows = iter_report_rows(queryset, details_queryset=details_queryset)
+    response = StreamingHttpResponse(
+        stream_csv(REPORT_CSV_HEADER, rows, encoding='cp932'),
+        content_type='text/csv; charset=cp932',
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def iter_users(queryset=None, chunk_size=None):
+    """ユーザーをチャンク単位で読み込む
+
+    プロファイルは select_related、グループはチャンクごとに prefetch するため、
+    ユーザーごとの追加クエリは発生しない。
+    """
+    if queryset is None:
+        queryset = User.objects.all().order_by('username')
+    return (
+        queryset
+        .select_related('userprofile')
+        .prefetch_related('groups')
+        .iterator(chunk_size=chunk_size or get_export_chunk_size())
+    )
+
+
+def user_record(user):
+    """ユーザー1人分の情報を辞書にする（JSON / NDJSON 出力用）"""
+    # UserProfileが存在しない場合は select_related の結果から例外になる
+    profile = user.userprofile if hasattr(user, 'userprofile') else None
+    return {
+        'username': user.username,
+        'last_name': user.last_name,
+        'first_name': user.first_name,
+        'email': user.email,
+        'is_active': user.is_active,
+        'is_staff': user.is_staff,
+        'is_superuser': user.is_superuser,
+        'groups': [group.name for group in user.groups.all()],
+        'additional_email': (profile.additional_email if profile else None) or '',
+        'last_login': user.last_login.isoformat() if user.last_login else None,
+        'date_joined': user.date_joined.isoformat(),
+    }
+
+
+def user_csv_row(user):
+    record = user_record(user)
+    return [
+        record['username'],
+        record['last_name'],
+        record['first_name'],
+        record['email'],
+        'アクティブ' if record['is_active'] else '無効',
+        'あり' if record['is_staff'] else 'なし',
+        'あり' if record['is_superuser'] else 'なし',
+        ', '.join(record['groups']),
+        record['additional_email'],
+        user.last_login.strftime('%Y-%m-%d %H:%M:%S') if user.last_login else '',
+        user.date_joined.strftime('%Y-%m-%d %H:%M:%S'),
+    ]
+
+
+def stream_json(records, ndjson=False, records_per_chunk=None):
+    """辞書のレコードを JSON 配列または NDJSON（1行1レコード）として少しずつ返す"""
+    records_per_chunk = records_per_chunk or get_export_chunk_size()
+    lines = []
+    first = True
+    if not ndjson:
+        yield b'['
+    for record in records:
+        line = json.dumps(record, ensure_ascii=False)
+        if ndjson:
+            lines.append(line + '\n')
+        else:
+            lines.append(line if first else ',\n' + line)
+        first = False
+        if len(lines) >= records_per_chunk:
+            yield ''.join(lines).encode('utf-8')
+            lines = []
+    if lines:
+        yield ''.join(lines).encode('utf-8')
+    if not ndjson:
+        yield b']\n'
+
+
+def get_delta_lag_seconds():
+    """差分エクスポートで、直近この秒数以内の更新は次回に回す（保存中のトランザクションを取りこぼさないため）"""
+    return getattr(settings, 'DELTA_EXPORT_LAG_SECONDS', 60)
+
+
+# URLに + をエンコードせずに書くと空白になるため、"...00:00:00 09:00" の空白は + に戻す
+_DECODED_PLUS_OFFSET = re.compile(r'(\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?) (\d{2}:?\d{2})$')
+
+
+def format_watermark(value):
+    """ウォーターマークの文字列（UTCの "2025-07-01T00:00:00.000000Z"）
+
+    + を含まないので、URLエンコードせずに ?since= に渡しても同じ値として読み込める。
+    """
+    return value.astimezone(dt_timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+def parse_watermark(value):
+    """ウォーターマーク（ISO 8601 の日時）を読み込む。タイムゾーンがなければ現在のタイムゾーンとみなす"""
+    if not value:
+        return None
+    watermark = datetime.fromisoformat(_DECODED_PLUS_OFFSET.sub(r'\1+\2', value.strip()))
+    if timezone.is_naive(watermark):
+        watermark = timezone.make_aware(watermark)
+    return watermark
+
+
+def delta_window(since):
+    """(since, until]: 今回エクスポートする更新日時の範囲。until が次回の since（新しいウォーターマーク）になる"""
+    until = timezone.now() - timedelta(seconds=get_delta_lag_seconds())
+    if since and until < since:
+        until = since
+    return since, until
+
+
+def delta_querysets(reports, since, until, visible_user_ids=None):
+    """範囲内に更新された日報と、削除された日報の記録（visible_user_ids で閲覧範囲に絞る）"""
+    reports = reports.filter(updated_at__lte=until)
+    tombstones = ReportTombstone.objects.filter(deleted_at__lte=until)
+    if since:
+        reports = reports.filter(updated_at__gt=since)
+        tombstones = tombstones.filter(deleted_at__gt=since)
+    if visible_user_ids is not None:
+        tombstones = tombstones.filter(user_id__in=visible_user_ids)
+    return reports.order_by('updated_at', 'id'), tombstones.order_by('deleted_at', 'id')
+
+
+def report_record(report):
+    """日報1件を作業詳細を含めた辞書にする（差分エクスポート用）"""
+    return {
+        'id': report.pk,
+        'user': report.user.username if report.user else '',
+        'date': report.date.isoformat(),
+        'remarks': report.remarks or '',
+        'comment': report.comment or '',
+        'boss_confirmation': report.boss_confirmation,
+        'is_submitted': report.is_submitted,
+        'created_at': report.created_at.isoformat(),
+        'updated_at': report.updated_at.isoformat(),
+        # prefetch済みのキャッシュを使うため all() で取得する
+        'details': [
+            {
+                'id': detail.pk,
+                'start_time': detail.start_time.isoformat() if detail.start_time else None,
+                'end_time': detail.end_time.isoformat() if detail.end_time else None,
+                'work_title': detail.work_title or '',
+                'client': detail.client or '',
+                'responsible_person': detail.responsible_person or '',
+            }
+            for detail in report.details.all()
+        ],
+    }
+
+
+def tombstone_record(tombstone):
+    return {
+        'id': tombstone.report_id,
+        'user': tombstone.username,
+        'date': tombstone.date.isoformat(),
+        'deleted_at': tombstone.deleted_at.isoformat(),
+    }
+
+
+def stream_delta(since, until, reports, tombstones, chunk_size=None):
+    """差分を1つのJSONとして少しずつ返す
+
+    {"since": ..., "watermark": ..., "reports": [...], "deleted": [...]}
+    日報は作業詳細をチャンクごとに prefetch するため、クエリ数は件数ではなくチャンク数に比例する。
+    """
+    chunk_size = chunk_size or get_export_chunk_size()
+    head = {'since': format_watermark(since) if since else None, 'watermark': format_watermark(until)}
+    yield (json.dumps(head, ensure_ascii=False)[:-1] + ', "reports": ').encode('utf-8')
+    reports = reports.select_related('user').prefetch_related('details').iterator(chunk_size=chunk_size)
+    yield from stream_json(report_record(report) for report in reports)
+    yield b', "deleted": '
+    yield from stream_json(tombstone_record(tombstone) for tombstone in tombstones.iterator(chunk_size=chunk_size))
+    yield b'}\n'
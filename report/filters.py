@@ -0,0 +1,82 @@
+import copy
+
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.cache import cache
+
+from . import caching
+from .roles import get_roles
+
+
+def cached(key, compute):
+    """キャッシュにあればその値を、なければ compute() の結果を保存して返す"""
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache.set(key, value, caching.get_timeout())
+    return value
+
+
+class UserListFilter(admin.SimpleListFilter):
+    """閲覧できるユーザーだけを選択肢にするユーザーの絞り込み
+
+    選択肢はキャッシュし、ユーザー・グループが変更されるまで再取得しない。
+    """
+    title = 'ユーザー'
+    # 以前の list_filter = ('user',) と同じパラメーター名にして、既存のURLを使えるようにする
+    parameter_name = 'user__id__exact'
+
+    def lookups(self, request, model_admin):
+        visible = get_roles(request).visible_user_ids
+        scope = 'all' if visible is None else tuple(sorted(visible))
+        key = caching.make_key('filter:users', scope, namespaces=(caching.USERS,))
+
+        def choices():
+            users = User.objects.order_by('username')
+            if visible is not None:
+                users = users.filter(id__in=visible)
+            return [(str(pk), username) for pk, username in users.values_list('id', 'username')]
+
+        return cached(key, choices)
+
+    def has_output(self):
+        # 自分の日報しか見られないユーザーには表示しない
+        return len(self.lookup_choices) > 1
+
+    def queryset(self, request, queryset):
+        value = self.value()
+        if value and value.isdigit():
+            return queryset.filter(user_id=int(value))
+        return queryset
+
+
+class CachedDateQuerySet:
+    """date_hierarchy が実行する日付範囲・日付一覧のクエリの結果をキャッシュするラッパー
+
+    キーには絞り込み後のクエリセットのSQLを使うため、閲覧範囲や他の絞り込みごとに別々に保存される。
+    """
+
+    def __init__(self, queryset):
+        self.queryset = queryset
+
+    @property
+    def _fingerprint(self):
+        return caching.queryset_fingerprint(self.queryset.order_by())
+
+    def aggregate(self, *args, **kwargs):
+        key = caching.make_key('date_hierarchy:range', self._fingerprint, sorted(kwargs))
+        return cached(key, lambda: self.queryset.aggregate(*args, **kwargs))
+
+    def dates(self, field_name, kind, order='ASC'):
+        key = caching.make_key('date_hierarchy:dates', self._fingerprint, field_name, kind, order)
+        return cached(key, lambda: list(self.queryset.dates(field_name, kind, order)))
+
+    def __getattr__(self, name):
+        return getattr(self.queryset, name)
+
+
+def cached_date_hierarchy_changelist(cl):
+    """date_hierarchy の描画用に、クエリセットだけを差し替えた ChangeList のコピーを返す"""
+    cl = copy.copy(cl)
+    cl.queryset = CachedDateQuerySet(cl.queryset)
+    return cl
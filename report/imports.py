@@ -0,0 +1,371 @@
+import codecs
+import csv
+import hashlib
+import time
+from datetime import datetime
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.utils import timezone
+
+from . import caching, summaries
+from .db import write_atomic
+from .models import DailyReport, DailyReportDetail, ImportCheckpoint
+
+# CSVの列数（日付〜提出状態）
+CSV_COLUMN_COUNT = 11
+
+# 検証エラーとして画面に表示する行数の上限
+MAX_REPORTED_ERRORS = 10
+
+
+def get_import_batch_size():
+    """bulk_create / 日報検索を1回で処理する件数"""
+    return getattr(settings, 'REPORT_IMPORT_BATCH_SIZE', 500)
+
+
+def get_import_commit_size():
+    """1トランザクションでコミットするCSVの行数"""
+    return getattr(settings, 'REPORT_IMPORT_COMMIT_SIZE', 5000)
+
+
+def iter_decoded_lines(uploaded_file, encoding='cp932'):
+    """アップロードファイルをチャンクごとにデコードし、1行ずつ返す
+
+    ファイル全体を read() せず、インクリメンタルデコーダーで
+    マルチバイト文字がチャンクの境界をまたいでも正しく変換する。
+    """
+    decoder = codecs.getincrementaldecoder(encoding)()
+    pending = ''
+    for chunk in uploaded_file.chunks():
+        pending += decoder.decode(chunk)
+        lines = pending.splitlines(keepends=True)
+        # 改行で終わっていない最後の行は次のチャンクと結合する
+        # （\r\n がチャンクの境界で分かれる場合も含む）
+        if lines and not lines[-1].endswith('\n'):
+            pending = lines.pop()
+        else:
+            pending = ''
+        yield from lines
+    pending += decoder.decode(b'', final=True)
+    if pending:
+        yield from pending.splitlines(keepends=True)
+
+
+def read_csv(uploaded_file, encoding='cp932'):
+    """アップロードファイルの csv.reader を返す（ヘッダー行は読み飛ばす）"""
+    reader = csv.reader(iter_decoded_lines(uploaded_file, encoding))
+    next(reader, None)
+    return reader
+
+
+def get_checkpoint(uploaded_file):
+    """アップロードファイルの内容に対応するインポート進捗を取得（なければ作成）する"""
+    digest = hashlib.sha256()
+    for chunk in uploaded_file.chunks():
+        digest.update(chunk)
+    checkpoint, _ = ImportCheckpoint.objects.get_or_create(
+        file_hash=digest.hexdigest(),
+        defaults={'file_name': uploaded_file.name[:255], 'file_size': uploaded_file.size or 0},
+    )
+    return checkpoint
+
+
+def restart_checkpoint(checkpoint):
+    """インポート進捗を消して、同じファイルを最初から取り込み直せるようにする"""
+    checkpoint.rows_committed = 0
+    checkpoint.completed = False
+    checkpoint.save(update_fields=['rows_committed', 'completed', 'updated_at'])
+
+
+# 日付・時刻は同じ値が何度も出てくるので変換結果をキャッシュする
+@lru_cache(maxsize=4096)
+def _parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+@lru_cache(maxsize=4096)
+def _parse_time(value):
+    return datetime.strptime(value, '%H:%M:%S').time()
+
+
+class ImportRow:
+    """CSVの1行分のデータ"""
+    __slots__ = (
+        'username', 'date', 'start_time', 'end_time', 'work_title', 'client',
+        'responsible_person', 'remarks', 'comment', 'boss_confirmation', 'is_submitted',
+    )
+
+    def __init__(self, row):
+        self.date = _parse_date(row[0])
+        self.username = row[1]
+        # 作業詳細は時間が入力されている場合のみ作成する
+        if row[2] and row[3]:
+            self.start_time = _parse_time(row[2])
+            self.end_time = _parse_time(row[3])
+        else:
+            self.start_time = self.end_time = None
+        self.work_title = row[4] or ''
+        self.client = row[5] or ''
+        self.responsible_person = row[6] or ''
+        self.remarks = row[7] or ''
+        self.comment = row[8] or ''
+        self.boss_confirmation = row[9] == '確認済'
+        self.is_submitted = row[10] == '提出済'
+
+
+class ImportResult:
+    """インポート結果（件数とフェーズごとの処理時間）"""
+
+    def __init__(self):
+        self.imported_count = 0
+        self.skipped_count = 0
+        self.created_reports = 0
+        self.created_details = 0
+        # 前回の続きから再開した場合に読み飛ばした行数
+        self.resumed_from = 0
+        self.timings = {}
+        self._started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def add_timing(self, phase, seconds):
+        self.timings[phase] = self.timings.get(phase, 0.0) + seconds
+
+    def finish(self):
+        self.elapsed = time.perf_counter() - self._started
+
+    @property
+    def rows_per_second(self):
+        if not self.elapsed:
+            return 0.0
+        return (self.imported_count + self.skipped_count) / self.elapsed
+
+    def summary(self):
+        phases = ' / '.join(
+            f'{PHASE_LABELS.get(phase, phase)} {seconds:.2f}秒'
+            for phase, seconds in self.timings.items()
+        )
+        return f'処理時間 {self.elapsed:.2f}秒・{self.rows_per_second:.0f}行/秒（{phases}）'
+
+
+PHASE_LABELS = {
+    'validate': '検証',
+    'parse': '解析',
+    'users': 'ユーザー',
+    'reports': '日報',
+    'details': '作業詳細',
+}
+
+
+class _Timer:
+    def __init__(self, result, phase):
+        self.result = result
+        self.phase = phase
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.result.add_timing(self.phase, time.perf_counter() - self.started)
+
+
+class ReportCsvImporter:
+    """日報CSVをまとめて取り込むインポーター
+
+    1行ごとにORMを呼び出すのではなく、行を commit_size 件ずつ区切って
+    1. ユーザー名を in_bulk で一括解決し
+    2. (ユーザー, 日付) ごとに日報をバッチで検索・作成し
+    3. 作業詳細を bulk_create でまとめて登録する
+    区切りごとに別トランザクションでコミットするので、大きなファイルでも
+    SQLiteの書き込みロックを長時間保持しない。
+    """
+
+    def __init__(self, batch_size=None, commit_size=None):
+        self.batch_size = batch_size or get_import_batch_size()
+        self.commit_size = commit_size or get_import_commit_size()
+        self.result = ImportResult()
+        # ユーザー名 -> User（バッチをまたいで再利用する）
+        # ユーザー名が空の行はユーザー未設定の日報として扱う
+        self.users = {'': None}
+        self.missing_usernames = set()
+        # 取り込みを終えたCSVの行数（ヘッダーを除く）
+        self.rows_committed = 0
+
+    def validate(self, reader):
+        """取り込む前にすべての行を解析し、誤りのある行を (行番号, 内容) のリストで返す
+
+        誤りのある行が途中のバッチで見つかると、それまでのバッチだけがコミットされ、
+        修正したファイル（内容が変わるため別の進捗になる）を取り込み直したときに作業詳細が重複する。
+        そのため、1行でも誤りがあれば何もコミットせずに全体を止める。
+        """
+        errors = []
+        with _Timer(self.result, 'validate'):
+            for row in reader:
+                if len(row) < CSV_COLUMN_COUNT:
+                    continue
+                try:
+                    ImportRow(row)
+                except ValueError as e:
+                    # 行番号はヘッダーを1行目として数える（reader.line_num は引用符内の改行も数える）
+                    errors.append((reader.line_num, str(e)))
+        return errors
+
+    def run(self, csv_rows, checkpoint=None):
+        """ヘッダーを除いたCSVの行を取り込み、ImportResult を返す
+
+        checkpoint を渡した場合は、その rows_committed 行目までを読み飛ばして
+        続きから取り込み、コミットのたびに進捗を記録する。
+        """
+        skip = checkpoint.rows_committed if checkpoint else 0
+        self.rows_committed = skip
+        self.result.resumed_from = skip
+
+        batch = []
+        batch_rows = 0
+        parse_timer = _Timer(self.result, 'parse')
+        for index, row in enumerate(csv_rows):
+            if index < skip:
+                continue
+            with parse_timer:
+                # 必要な列数に満たない行は無視する
+                if len(row) >= CSV_COLUMN_COUNT:
+                    batch.append(ImportRow(row))
+            batch_rows += 1
+            if batch_rows >= self.commit_size:
+                self.import_batch(batch, batch_rows, checkpoint)
+                batch = []
+                batch_rows = 0
+
+        if batch_rows:
+            self.import_batch(batch, batch_rows, checkpoint)
+        if checkpoint:
+            checkpoint.completed = True
+            checkpoint.save(update_fields=['completed', 'updated_at'])
+
+        self.result.finish()
+        return self.result
+
+    def import_batch(self, rows, row_count, checkpoint=None):
+        """1バッチ分の行を1トランザクションで取り込む"""
+        with write_atomic():
+            with _Timer(self.result, 'users'):
+                self.resolve_users(rows)
+            rows = self.filter_known_users(rows, self.users)
+
+            with _Timer(self.result, 'reports'):
+                reports = self.get_or_create_reports(rows, self.users)
+
+            with _Timer(self.result, 'details'):
+                self.create_details(rows, self.users, reports)
+
+            self.rows_committed += row_count
+            if checkpoint:
+                # 進捗はデータと同じトランザクションで記録する
+                checkpoint.rows_committed = self.rows_committed
+                checkpoint.save(update_fields=['rows_committed', 'updated_at'])
+
+        self.result.imported_count += len(rows)
+
+    def resolve_users(self, rows):
+        """未解決のユーザー名を1クエリでまとめて User に変換する"""
+        usernames = {row.username for row in rows} - self.users.keys() - self.missing_usernames
+        if usernames:
+            found = User.objects.in_bulk(usernames, field_name='username')
+            self.users.update(found)
+            # 存在しないユーザー名も記録して、次のバッチで再検索しない
+            self.missing_usernames.update(usernames - found.keys())
+        return self.users
+
+    def filter_known_users(self, rows, users):
+        # 存在しないユーザーの行はスキップ
+        known = [row for row in rows if row.username in users]
+        self.result.skipped_count += len(rows) - len(known)
+        return known
+
+    def _report_key(self, user, date):
+        return (user.pk if user else None, date)
+
+    def get_or_create_reports(self, rows, users):
+        """(ユーザー, 日付) をキーに日報を取得し、存在しないものはまとめて作成する
+
+        既存の日報は更新しない（従来の get_or_create と同じ動作）。
+        新規作成時の値にはそのキーで最初に現れた行を使う。
+        """
+        first_rows = {}
+        for row in rows:
+            key = self._report_key(users[row.username], row.date)
+            first_rows.setdefault(key, row)
+
+        reports = {}
+        keys = list(first_rows)
+        for start in range(0, len(keys), self.batch_size):
+            batch = keys[start:start + self.batch_size]
+            existing = self._fetch_reports(batch)
+            missing = [key for key in batch if key not in existing]
+            if missing:
+                # 同時に別の取り込みが同じ日報を作成しても一意制約で弾かれるだけにする
+                DailyReport.objects.bulk_create(
+                    [self._new_report(key, first_rows[key], users) for key in missing],
+                    batch_size=self.batch_size,
+                    ignore_conflicts=True,
+                )
+                # ignore_conflicts ではpkが返らないため再取得する
+                created = self._fetch_reports(missing)
+                # 一意制約で弾かれた行は作成件数に含めない（再取得で見つかったキーだけ数える）
+                self.result.created_reports += len(created)
+                existing.update(created)
+            reports.update(existing)
+        return reports
+
+    def _fetch_reports(self, keys):
+        user_ids = {user_id for user_id, _ in keys}
+        dates = {date for _, date in keys}
+        queryset = DailyReport.objects.filter(date__in=dates)
+        if None in user_ids:
+            user_ids.discard(None)
+            queryset = queryset.filter(user__in=user_ids) | queryset.filter(user__isnull=True)
+        else:
+            queryset = queryset.filter(user__in=user_ids)
+
+        found = {}
+        wanted = set(keys)
+        # 同じキーの日報が複数ある場合は最初のもの（id順）を使う
+        for report in queryset.order_by('id'):
+            key = (report.user_id, report.date)
+            if key in wanted and key not in found:
+                found[key] = report
+        return found
+
+    def _new_report(self, key, row, users):
+        return DailyReport(
+            user=users[row.username],
+            date=key[1],
+            remarks=row.remarks,
+            comment=row.comment,
+            boss_confirmation=row.boss_confirmation,
+            is_submitted=row.is_submitted,
+        )
+
+    def create_details(self, rows, users, reports):
+        details = [
+            DailyReportDetail(
+                report=reports[self._report_key(users[row.username], row.date)],
+                start_time=row.start_time,
+                end_time=row.end_time,
+                work_title=row.work_title,
+                client=row.client,
+                responsible_person=row.responsible_person,
+            )
+            for row in rows
+            if row.start_time and row.end_time
+        ]
+        DailyReportDetail.objects.bulk_create(details, batch_size=self.batch_size)
+        self.result.created_details += len(details)
+        # 既存の日報に作業詳細を追加した場合も、差分エクスポートの対象になるよう更新日時を進める
+        DailyReport.objects.filter(pk__in={detail.report_id for detail in details}).update(updated_at=timezone.now())
+        # bulk_create ではシグナルが送られないため、作業時間の集計対象をまとめて登録する
+        summaries.mark_dirty_many((detail.report.user_id, detail.report.date) for detail in details)
+        # 一覧の件数・ページのキャッシュも同じ理由で明示的に無効にする
+        caching.bump_version_on_commit(caching.REPORTS)
@@ -0,0 +1,87 @@
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# LogRecord が標準で持つ属性（これ以外は extra= で渡された項目として出力する）
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'taskName'}
+
+
+class JsonFormatter(logging.Formatter):
+    """1行1件のJSON（JSONL）で出力するフォーマッター"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created).astimezone().isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'module': record.module,
+            'line': record.lineno,
+            'process': record.process,
+            'thread': record.threadName,
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and key not in entry:
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def build_file_handler(filename, level='NOTSET', max_bytes=10 * 1024 * 1024, backup_count=10, format='json'):
+    """サイズでローテーションするファイルハンドラー（format: 'json' または 'message'）"""
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    handler = RotatingFileHandler(
+        filename, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8', delay=True,
+    )
+    handler.setLevel(level)
+    handler.setFormatter(JsonFormatter() if format == 'json' else logging.Formatter('%(message)s'))
+    return handler
+
+
+class QueueListenerHandler(QueueHandler):
+    """ログをキューに入れるだけで戻り、ファイルへの書き込みはバックグラウンドのスレッドで行うハンドラー
+
+    LOGGING（dictConfig）から '()' で作成する。targets には build_file_handler の引数を並べる。
+    """
+
+    def __init__(self, targets, max_bytes=10 * 1024 * 1024, backup_count=10):
+        super().__init__(queue.SimpleQueue())
+        self.targets = [
+            build_file_handler(**{'max_bytes': max_bytes, 'backup_count': backup_count, **dict(target)})
+            for target in targets
+        ]
+        # 出力先ごとのレベル（エラーだけのファイルなど）を有効にする
+        self.listener = QueueListener(self.queue, *self.targets, respect_handler_level=True)
+        self.listener.start()
+        self._stopped = False
+        # 終了時にキューに残ったログを書き出す
+        atexit.register(self.stop_listener)
+
+    def stop_listener(self):
+        if not self._stopped:
+            self._stopped = True
+            self.listener.stop()
+
+    def prepare(self, record):
+        # 引数を埋め込んだメッセージだけをここで確定し、JSONへの整形はバックグラウンドで行う
+        # （標準の prepare は例外情報を文字列に埋め込んでしまうため使わない）
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def close(self):
+        self.stop_listener()
+        for handler in self.targets:
+            handler.close()
+        super().close()
@@ -0,0 +1,125 @@
+import logging
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import F
+from django.utils import timezone
+
+from .db import write_atomic
+from .models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_email(subject, body, from_email, recipients):
+    """通知メールを送信キューに登録する
+
+    呼び出し元のトランザクション内で保存されるため、日報の保存が
+    ロールバックされた場合はメールも送信されない。
+    """
+    return OutboundEmail.objects.create(
+        subject=subject[:255],
+        body=body,
+        from_email=from_email,
+        recipients=','.join(recipients),
+    )
+
+
+def _retry_delay(attempts):
+    """再送までの待ち時間（試行回数ごとに倍にし、上限で打ち止め）"""
+    base = getattr(settings, 'MAIL_QUEUE_RETRY_SECONDS', 60)
+    maximum = getattr(settings, 'MAIL_QUEUE_RETRY_MAX_SECONDS', 3600)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), maximum))
+
+
+def claim_queued_mail(batch_size):
+    """送信時刻を過ぎたメールを「送信中」にして、このワーカーの分として取得する
+
+    状態と送信時刻を条件にした UPDATE で取得するため、cron とワーカーが重なって動いても
+    同じメールを取得できるのは1つだけになる。送信中のまま MAIL_QUEUE_CLAIM_SECONDS を過ぎたメール
+    （ワーカーが送信中に落ちた場合）は、もう一度取得できる。
+    """
+    now = timezone.now()
+    claimable = (
+        OutboundEmail.objects
+        .filter(status__in=[OutboundEmail.STATUS_PENDING, OutboundEmail.STATUS_SENDING], next_attempt_at__lte=now)
+    )
+    ids = list(claimable.order_by('next_attempt_at', 'id').values_list('id', flat=True)[:batch_size])
+    if not ids:
+        return []
+
+    token = uuid.uuid4().hex
+    with write_atomic():
+        claimable.filter(id__in=ids).update(
+            status=OutboundEmail.STATUS_SENDING,
+            claim_token=token,
+            next_attempt_at=now + timedelta(seconds=getattr(settings, 'MAIL_QUEUE_CLAIM_SECONDS', 600)),
+        )
+    # 別のワーカーが先に取得したメールは含まれない
+    return list(OutboundEmail.objects.filter(id__in=ids, claim_token=token).order_by('next_attempt_at', 'id'))
+
+
+def send_queued_mail(batch_size=None, connection=None):
+    """送信時刻を過ぎたキューのメールを取得し、1つのSMTP接続でまとめて送信する
+
+    戻り値は (送信できた件数, 失敗した件数)
+    """
+    batch_size = batch_size or getattr(settings, 'MAIL_QUEUE_BATCH_SIZE', 50)
+    max_attempts = getattr(settings, 'MAIL_QUEUE_MAX_ATTEMPTS', 5)
+
+    queued = claim_queued_mail(batch_size)
+    if not queued:
+        return 0, 0
+
+    connection = connection or get_connection(fail_silently=False)
+    sent_ids = []
+    failed_ids = []
+    try:
+        # 接続は一度だけ開いてバッチ全体で使い回す
+        connection.open()
+        for email in queued:
+            message = EmailMessage(
+                email.subject, email.body, email.from_email, email.recipient_list,
+                connection=connection,
+            )
+            try:
+                connection.send_messages([message])
+            except Exception as e:
+                failed_ids.append(email.id)
+                _mark_failed(email, e, max_attempts)
+            else:
+                sent_ids.append(email.id)
+    except Exception as e:
+        # 接続自体に失敗した場合は、未送信のメールをすべて再送待ちにする
+        for email in queued:
+            if email.id not in sent_ids and email.id not in failed_ids:
+                failed_ids.append(email.id)
+                _mark_failed(email, e, max_attempts)
+    finally:
+        connection.close()
+
+    if sent_ids:
+        OutboundEmail.objects.filter(id__in=sent_ids).update(
+            status=OutboundEmail.STATUS_SENT,
+            sent_at=timezone.now(),
+            attempts=F('attempts') + 1,
+            last_error='',
+        )
+        logger.info('メール送信成功: %s件', len(sent_ids))
+    return len(sent_ids), len(failed_ids)
+
+
+def _mark_failed(email, error, max_attempts):
+    email.attempts += 1
+    email.last_error = str(error)
+    if email.attempts >= max_attempts:
+        email.status = OutboundEmail.STATUS_FAILED
+        logger.error('メール送信エラー（再送を中止）: id=%s %s', email.id, error)
+    else:
+        email.status = OutboundEmail.STATUS_PENDING
+        email.next_attempt_at = timezone.now() + _retry_delay(email.attempts)
+        logger.warning('メール送信エラー（%s回目、再送予定 %s）: id=%s %s',
+                       email.attempts, email.next_attempt_at, email.id, error)
+    email.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
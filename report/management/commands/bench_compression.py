@@ -0,0 +1,106 @@
+import json
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from report.metrics import percentile
+
+TARGETS = {
+    'changelist': 'admin:report_dailyreport_changelist',
+    'export_csv': 'export_csv',
+    'export_users_csv': 'export_users_csv',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        '管理画面・CSVエクスポートを gzip あり／なしで取得し、転送バイト数と最後のバイトまでの時間を比較する。'
+        '回線速度を指定すると、その回線での転送時間の目安も表示する。'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=3, help='各URLの計測回数')
+        parser.add_argument('--target', action='append', choices=list(TARGETS),
+                            help='計測するURL（複数指定可、省略時はすべて）')
+        parser.add_argument('--bandwidth', type=float, action='append',
+                            help='転送時間の目安を計算する回線速度（Mbps、複数指定可。既定は 100 と 10）')
+        parser.add_argument('--output', help='結果をJSONで書き出すファイル')
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(is_superuser=True, is_active=True).order_by('id').first()
+        if not user:
+            raise CommandError('スーパーユーザーが必要です（generate_demo_data で作成できます）')
+        client = Client()
+        client.force_login(user)
+        bandwidths = options['bandwidth'] or [100.0, 10.0]
+
+        results = {}
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            for name in options['target'] or TARGETS:
+                url = reverse(TARGETS[name])
+                results[name] = {
+                    encoding: self.measure(client, url, encoding, options['repeat'], bandwidths)
+                    for encoding in ('identity', 'gzip')
+                }
+                self.print_result(name, results[name])
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump({
+                    'benchmark': 'compression',
+                    'timestamp': datetime.now(timezone.utc).isoformat(),
+                    'gzip_min_length': getattr(settings, 'GZIP_MIN_LENGTH', None),
+                    'results': results,
+                }, f, ensure_ascii=False, indent=2)
+
+    def measure(self, client, url, encoding, repeat, bandwidths):
+        first_byte = []
+        last_byte = []
+        sizes = []
+        content_encoding = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            response = client.get(url, HTTP_ACCEPT_ENCODING=encoding)
+            if response.status_code >= 400:
+                raise CommandError(f'{url}: HTTP {response.status_code}')
+            chunks = response.streaming_content if response.streaming else [response.content]
+            size = 0
+            ttfb = None
+            for chunk in chunks:
+                if chunk and ttfb is None:
+                    ttfb = (time.perf_counter() - started) * 1000
+                size += len(chunk)
+            first_byte.append(ttfb or 0.0)
+            last_byte.append((time.perf_counter() - started) * 1000)
+            sizes.append(size)
+            content_encoding = response.get('Content-Encoding')
+        size = max(sizes)
+        ttlb = percentile(last_byte, 50)
+        return {
+            'content_encoding': content_encoding,
+            'bytes': size,
+            'ttfb_ms': percentile(first_byte, 50),
+            'ttlb_ms': ttlb,
+            # サーバーの処理時間に、回線で送る時間を足した目安
+            'estimated_ms': {
+                f'{mbps:g}Mbps': ttlb + size * 8 / (mbps * 1000) for mbps in bandwidths
+            },
+        }
+
+    def print_result(self, name, result):
+        identity = result['identity']
+        gzip = result['gzip']
+        ratio = identity['bytes'] / gzip['bytes'] if gzip['bytes'] else 0
+        self.stdout.write(self.style.MIGRATE_HEADING(f'{name}（圧縮率 x{ratio:.1f}）'))
+        for encoding, row in result.items():
+            estimates = '  '.join(f'{label}={ms:8.1f}ms' for label, ms in row['estimated_ms'].items())
+            self.stdout.write(
+                f'  {encoding:8s} {row["content_encoding"] or "-":5s} bytes={row["bytes"]:>11,d} '
+                f'ttfb={row["ttfb_ms"]:8.1f}ms ttlb={row["ttlb_ms"]:8.1f}ms  {estimates}'
+            )
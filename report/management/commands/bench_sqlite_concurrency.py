@@ -0,0 +1,243 @@
+import json
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from report.db import apply_sqlite_pragmas, get_sqlite_pragmas
+from report.metrics import percentile
+
+# PRAGMAを設定しない場合（変更前）の状態
+BASELINE_PRAGMAS = {'journal_mode': 'DELETE', 'synchronous': 'FULL'}
+
+
+class Command(BaseCommand):
+    help = (
+        '日報の同時提出（書き込み）と一覧表示（読み込み）を並行して実行し、'
+        'レイテンシ（p50/p99）とロックエラー数を計測する。'
+        'DBのコピーに対して実行するため本番データは変更しない。'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8, help='同時に日報を提出するスレッド数')
+        parser.add_argument('--readers', type=int, default=8, help='同時に一覧を表示するスレッド数')
+        parser.add_argument('--duration', type=float, default=10, help='計測時間（秒）')
+        parser.add_argument('--details', type=int, default=7, help='1回の提出で作成する作業詳細の件数')
+        parser.add_argument('--database-file', help='コピー元のSQLiteファイル（省略時は settings の default）')
+        parser.add_argument(
+            '--mode', choices=['tuned', 'immediate', 'baseline', 'compare'], default='compare',
+            help='tuned: SQLITE_PRAGMAS を適用し、書き込みだけ IMMEDIATE（write_atomic と同じ） / '
+                 'immediate: 読み込みのトランザクションも IMMEDIATE / baseline: どちらも適用しない / '
+                 'compare: すべてを計測',
+        )
+        parser.add_argument('--output', help='結果をJSONで書き出すファイル')
+
+    def handle(self, *args, **options):
+        source = options['database_file'] or str(settings.DATABASES['default']['NAME'])
+        if not os.path.exists(source):
+            raise CommandError(f'データベースが見つかりません: {source}（先に migrate を実行してください）')
+
+        modes = ['baseline', 'immediate', 'tuned'] if options['mode'] == 'compare' else [options['mode']]
+        results = {}
+        workdir = tempfile.mkdtemp(prefix='report-bench-')
+        try:
+            for mode in modes:
+                path = os.path.join(workdir, f'{mode}.sqlite3')
+                self.copy_database(source, path)
+                if mode == 'tuned':
+                    # 画面表示などの読み込みは設定の transaction_mode（既定 DEFERRED）、書き込みは write_atomic
+                    pragmas = get_sqlite_pragmas()
+                    read_mode = settings.DATABASES['default'].get('OPTIONS', {}).get('transaction_mode')
+                    write_mode = 'IMMEDIATE'
+                elif mode == 'immediate':
+                    # すべてのトランザクションを IMMEDIATE にした場合（読み込みも書き込みロックを待つ）
+                    pragmas, read_mode, write_mode = get_sqlite_pragmas(), 'IMMEDIATE', 'IMMEDIATE'
+                else:
+                    pragmas, read_mode, write_mode = BASELINE_PRAGMAS, None, None
+                results[mode] = self.run_benchmark(path, pragmas, read_mode, write_mode, options)
+                self.print_result(mode, results[mode])
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        if options['output']:
+            payload = {
+                'benchmark': 'sqlite_concurrency',
+                'timestamp': datetime.now(timezone.utc).isoformat(),
+                'writers': options['writers'],
+                'readers': options['readers'],
+                'duration': options['duration'],
+                'results': results,
+            }
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(payload, f, ensure_ascii=False, indent=2)
+
+    def copy_database(self, source, path):
+        # 実行中のDBからでも整合性のあるコピーを作るため backup API を使う
+        src = sqlite3.connect(source)
+        dst = sqlite3.connect(path)
+        try:
+            src.backup(dst)
+        finally:
+            src.close()
+            dst.close()
+
+    def connect(self, path, pragmas):
+        # Django と同じく20秒の待機時間で接続する
+        conn = sqlite3.connect(path, timeout=20, isolation_level=None, check_same_thread=False)
+        apply_sqlite_pragmas(conn, pragmas)
+        return conn
+
+    def run_benchmark(self, path, pragmas, read_mode, write_mode, options):
+        # journal_mode はファイルに保存されるので、ここで一度設定しておく
+        self.connect(path, pragmas).close()
+
+        deadline = time.perf_counter() + options['duration']
+        stats = {
+            'write': {'latencies': [], 'errors': 0},
+            'read': {'latencies': [], 'errors': 0},
+        }
+        lock = threading.Lock()
+        # 一意制約 (user, date) と重ならないよう、ユーザー未設定の遠い未来の日付で作成する
+        counter = iter(range(10 ** 9))
+
+        def record(kind, started, error=False):
+            with lock:
+                if error:
+                    stats[kind]['errors'] += 1
+                else:
+                    stats[kind]['latencies'].append((time.perf_counter() - started) * 1000)
+
+        def writer():
+            conn = self.connect(path, pragmas)
+            try:
+                while time.perf_counter() < deadline:
+                    started = time.perf_counter()
+                    with lock:
+                        n = next(counter)
+                    try:
+                        self.submit_report(conn, n, options['details'], write_mode)
+                    except sqlite3.OperationalError:
+                        if conn.in_transaction:
+                            conn.execute('ROLLBACK')
+                        record('write', started, error=True)
+                    else:
+                        record('write', started)
+            finally:
+                conn.close()
+
+        def reader():
+            conn = self.connect(path, pragmas)
+            rng = random.Random()
+            try:
+                while time.perf_counter() < deadline:
+                    started = time.perf_counter()
+                    try:
+                        self.load_changelist(conn, rng, read_mode)
+                    except sqlite3.OperationalError:
+                        if conn.in_transaction:
+                            conn.execute('ROLLBACK')
+                        record('read', started, error=True)
+                    else:
+                        record('read', started)
+            finally:
+                conn.close()
+
+        threads = (
+            [threading.Thread(target=writer) for _ in range(options['writers'])]
+            + [threading.Thread(target=reader) for _ in range(options['readers'])]
+        )
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        result = {
+            'pragmas': pragmas,
+            'read_transaction_mode': read_mode or 'DEFERRED',
+            'write_transaction_mode': write_mode or 'DEFERRED',
+        }
+        for kind, values in stats.items():
+            latencies = values['latencies']
+            result[kind] = {
+                'count': len(latencies),
+                'errors': values['errors'],
+                'per_second': len(latencies) / options['duration'],
+                'p50_ms': percentile(latencies, 50),
+                'p99_ms': percentile(latencies, 99),
+                'max_ms': max(latencies) if latencies else None,
+            }
+        return result
+
+    def submit_report(self, conn, n, detail_count, transaction_mode=None):
+        """管理画面からの日報提出と同じ程度の書き込みを1トランザクションで行う
+
+        Django の atomic() と同じく、読み込みの後に書き込むトランザクションにする。
+        """
+        now = datetime.now(timezone.utc).isoformat(sep=' ')
+        report_date = (date(2100, 1, 1) + timedelta(days=n)).isoformat()
+        conn.execute(f'BEGIN {transaction_mode}' if transaction_mode else 'BEGIN')
+        conn.execute(
+            'SELECT id FROM report_dailyreport WHERE user_id IS NULL AND date = ?', (report_date,)
+        ).fetchall()
+        cursor = conn.execute(
+            'INSERT INTO report_dailyreport '
+            '(user_id, date, boss_confirmation, remarks, comment, is_submitted, created_at, updated_at) '
+            'VALUES (NULL, ?, 0, ?, NULL, 1, ?, ?)',
+            (report_date, 'benchmark', now, now),
+        )
+        report_id = cursor.lastrowid
+        conn.executemany(
+            'INSERT INTO report_dailyreportdetail '
+            '(report_id, start_time, end_time, work_title, client, responsible_person) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            [
+                (report_id, f'{9 + i:02d}:00:00', f'{10 + i:02d}:00:00', 'benchmark', '', '')
+                for i in range(detail_count)
+            ],
+        )
+        conn.execute('COMMIT')
+
+    def load_changelist(self, conn, rng, transaction_mode=None):
+        """一覧画面と同じ程度の読み込み（件数・1ページ分の日報と作業詳細）を行う
+
+        変更画面の表示（atomic() の中で読み込むだけ）と同じく、1つのトランザクションで読み込む。
+        """
+        conn.execute(f'BEGIN {transaction_mode}' if transaction_mode else 'BEGIN')
+        total = conn.execute('SELECT COUNT(*) FROM report_dailyreport').fetchone()[0]
+        offset = rng.randrange(max(total - 20, 1))
+        rows = conn.execute(
+            'SELECT r.id, r.date, u.username FROM report_dailyreport r '
+            'LEFT JOIN auth_user u ON u.id = r.user_id '
+            'ORDER BY r.date DESC, r.id DESC LIMIT 20 OFFSET ?',
+            (offset,),
+        ).fetchall()
+        ids = [row[0] for row in rows]
+        if ids:
+            placeholders = ','.join('?' * len(ids))
+            conn.execute(
+                f'SELECT * FROM report_dailyreportdetail WHERE report_id IN ({placeholders})', ids
+            ).fetchall()
+        conn.execute('COMMIT')
+
+    def print_result(self, mode, result):
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'[{mode}] {result["pragmas"]} 読み込み={result["read_transaction_mode"]} '
+            f'書き込み={result["write_transaction_mode"]}'
+        ))
+        for kind in ('write', 'read'):
+            values = result[kind]
+            self.stdout.write(
+                f'  {kind:5s}: {values["count"]}件 ({values["per_second"]:.1f}/秒) '
+                f'p50={self.format_ms(values["p50_ms"])} p99={self.format_ms(values["p99_ms"])} '
+                f'max={self.format_ms(values["max_ms"])} エラー={values["errors"]}'
+            )
+
+    def format_ms(self, value):
+        return '-' if value is None else f'{value:.1f}ms'
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.migrations.loader import MigrationLoader
+
+from report.dedupe import merge_duplicate_reports
+
+# (user, date) の一意制約を追加するマイグレーションと、その直前のマイグレーション
+UNIQUE_MIGRATION = ('report', '0021_dailyreport_indexes_and_unique')
+BEFORE_UNIQUE_MIGRATION = ('report', '0020_importcheckpoint')
+
+
+class Command(BaseCommand):
+    help = (
+        '同じユーザー・同じ日付の重複した日報を1件にまとめる（マイグレーション0021の適用前のDBが対象）。'
+        '0021 の適用時にも自動でまとめられるため、通常は --dry-run で件数を確認するだけでよい。'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='変更せずに、まとめる対象の件数だけを表示する',
+        )
+
+    def handle(self, *args, **options):
+        loader = MigrationLoader(connection)
+        if UNIQUE_MIGRATION in loader.applied_migrations:
+            self.stdout.write('マイグレーション0021 は適用済みです（一意制約があるため、重複した日報はありません）。')
+            return
+
+        # 0021 より前のDBには、シグナルが書き込む削除の記録・集計のテーブルがまだない。
+        # マイグレーションと同じく、その時点のモデル（シグナルが送られない）でまとめる
+        apps = loader.project_state(BEFORE_UNIQUE_MIGRATION).apps
+        dry_run = options['dry_run']
+        with transaction.atomic():
+            groups, deleted, moved = merge_duplicate_reports(
+                apps.get_model('report', 'DailyReport'), apps.get_model('report', 'DailyReportDetail'),
+                dry_run=dry_run,
+            )
+
+        prefix = '[dry-run] ' if dry_run else ''
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix}重複グループ {groups}件: 日報 {deleted}件を削除、作業詳細 {moved}件を移動しました。'
+        ))
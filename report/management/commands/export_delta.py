@@ -0,0 +1,48 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from report.exports import delta_querysets, delta_window, format_watermark, parse_watermark, stream_delta
+from report.models import DailyReport
+
+
+class Command(BaseCommand):
+    help = (
+        '前回のウォーターマーク以降に更新・削除された日報を、作業詳細を含めたJSONで書き出す。'
+        '--state-file を指定すると、前回のウォーターマークを読み込み、書き出しが終わったら新しい値を保存する。'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='この日時より後の更新を書き出す（ISO 8601、省略時はすべて）')
+        parser.add_argument('--state-file', help='ウォーターマークを保存するファイル（夜間の連携用）')
+        parser.add_argument('--output', help='書き出すファイル（省略時は標準出力）')
+
+    def handle(self, *args, **options):
+        since = options['since']
+        if since is None and options['state_file'] and os.path.exists(options['state_file']):
+            with open(options['state_file'], encoding='utf-8') as f:
+                since = f.read().strip()
+        try:
+            since = parse_watermark(since)
+        except ValueError:
+            raise CommandError(f'ウォーターマークを日時として読み込めません: {since}')
+
+        since, until = delta_window(since)
+        reports, tombstones = delta_querysets(DailyReport.objects.all(), since, until)
+        chunks = stream_delta(since, until, reports, tombstones)
+        if options['output']:
+            with open(options['output'], 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+        else:
+            for chunk in chunks:
+                # チャンクはレコードの区切りで分かれているため、チャンクごとにデコードできる
+                self.stdout.write(chunk.decode('utf-8'), ending='')
+
+        # 書き出しが最後まで終わってから保存する（途中で失敗した場合は次回も同じ範囲から書き出す）
+        if options['state_file']:
+            temp_path = f'{options["state_file"]}.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write(format_watermark(until))
+            os.replace(temp_path, options['state_file'])
+        self.stderr.write(f'ウォーターマーク: {format_watermark(until)}')
@@ -0,0 +1,144 @@
+import random
+from datetime import date, time, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from report import caching
+from report.models import DailyReport, DailyReportDetail, WorkHoursDaily, WorkHoursMonthly
+from report.roles import LEADER_GROUP
+from report.summaries import rebuild_summaries
+
+TEAM_GROUPS = ['パターンA', 'パターンB', 'パターンC', 'パターンD']
+
+WORK_TITLES = [
+    '名刺印刷', 'チラシ印刷', 'パンフレット校正', '封筒印刷', 'ポスター出力', '製本作業',
+    '版下作成', 'データ入稿確認', '色校正', '断裁・梱包', '納品', '見積作成', '打ち合わせ',
+    '看板設置', 'DM発送準備', '伝票整理',
+]
+CLIENTS = [
+    '株式会社あさひ商事', '藤沢工業株式会社', '湘南物産', '有限会社みなと印刷', '江ノ島観光協会',
+    '辻堂クリニック', '鵠沼学園', '片瀬不動産', '茅ヶ崎建設', '大船フーズ', '',
+]
+RESPONSIBLE_PERSONS = ['佐藤', '鈴木', '高橋', '田中', '伊藤', '渡辺', '山本', '中村', '']
+REMARKS = [
+    '', '', '', '特になし', '納期前倒しの依頼あり', '機械トラブルのため作業遅延',
+    '新規案件の問い合わせあり', '雨天のため配送を翌日に変更', '在庫の補充が必要',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        '性能確認用のデモデータ（ユーザー・グループ・日報・作業詳細）を bulk_create で作成する。'
+        '同じ --seed なら同じデータになる。'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50, help='作成するユーザー数')
+        parser.add_argument('--years', type=float, default=1, help='作成する日報の期間（年）')
+        parser.add_argument('--seed', type=int, default=0, help='乱数のシード')
+        parser.add_argument('--end-date', type=date.fromisoformat, default=None,
+                            help='日報の最終日（YYYY-MM-DD、省略時は今日）')
+        parser.add_argument('--prefix', default='demo', help='作成するユーザー名の接頭辞')
+        parser.add_argument('--password', default='demo-password', help='作成するユーザーのパスワード')
+        parser.add_argument('--leader-ratio', type=float, default=0.1, help='リーダーにするユーザーの割合')
+        parser.add_argument('--batch-size', type=int, default=1000, help='bulk_create の件数')
+        parser.add_argument('--clear', action='store_true', help='同じ接頭辞のユーザーと日報を先に削除する')
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        existing = User.objects.filter(username__startswith=f'{prefix}_')
+        if existing.exists():
+            if not options['clear']:
+                raise CommandError(f'{prefix}_ で始まるユーザーが既に存在します（--clear で削除してから作成します）')
+            with transaction.atomic():
+                DailyReport.objects.filter(user__in=existing).delete()
+                existing.delete()
+
+        rng = random.Random(options['seed'])
+        end_date = options['end_date'] or date.today()
+        start_date = end_date - timedelta(days=round(365 * options['years']))
+
+        with transaction.atomic():
+            users = self.create_users(rng, options)
+            report_count, detail_count = self.create_reports(rng, users, start_date, end_date, options['batch_size'])
+            # bulk_create ではシグナルが送られないため、集計テーブルとキャッシュはまとめて作り直す
+            rebuild_summaries(DailyReportDetail, WorkHoursDaily, WorkHoursMonthly)
+            caching.bump_version_on_commit(caching.REPORTS, caching.USERS)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'ユーザー {len(users)}人（+管理者 {prefix}_admin）、日報 {report_count}件、'
+            f'作業詳細 {detail_count}件を作成しました（{start_date}〜{end_date}）。'
+        ))
+
+    def create_users(self, rng, options):
+        prefix = options['prefix']
+        # パスワードのハッシュ化は遅いので1回だけ計算して使い回す
+        password = make_password(options['password'])
+        groups = {name: Group.objects.get_or_create(name=name)[0] for name in [LEADER_GROUP] + TEAM_GROUPS}
+
+        User.objects.create(
+            username=f'{prefix}_admin', password=password, email=f'{prefix}_admin@example.com',
+            is_staff=True, is_superuser=True,
+        )
+        users = User.objects.bulk_create([
+            User(
+                username=f'{prefix}_{i:04d}', password=password, email=f'{prefix}_{i:04d}@example.com',
+                last_name=rng.choice(RESPONSIBLE_PERSONS[:-1]), is_staff=True,
+            )
+            for i in range(options['users'])
+        ])
+        # bulk_create で pk が返らないDBでも動くよう取得し直す
+        users = list(User.objects.filter(username__in=[user.username for user in users]).order_by('username'))
+
+        memberships = []
+        leader_count = max(1, round(len(users) * options['leader_ratio'])) if users else 0
+        for i, user in enumerate(users):
+            memberships.append(User.groups.through(user_id=user.pk, group_id=groups[TEAM_GROUPS[i % len(TEAM_GROUPS)]].pk))
+            if i < leader_count:
+                memberships.append(User.groups.through(user_id=user.pk, group_id=groups[LEADER_GROUP].pk))
+        User.groups.through.objects.bulk_create(memberships)
+        return users
+
+    def create_reports(self, rng, users, start_date, end_date, batch_size):
+        workdays = [
+            start_date + timedelta(days=n) for n in range((end_date - start_date).days + 1)
+            if (start_date + timedelta(days=n)).weekday() < 5
+        ]
+        report_count = detail_count = 0
+        for user in users:
+            reports = [
+                DailyReport(
+                    user=user,
+                    date=day,
+                    remarks=rng.choice(REMARKS),
+                    is_submitted=rng.random() < 0.95,
+                    boss_confirmation=day < end_date - timedelta(days=7) and rng.random() < 0.9,
+                )
+                # 休暇などで1割程度は日報がない日にする
+                for day in workdays if rng.random() < 0.9
+            ]
+            reports = DailyReport.objects.bulk_create(reports, batch_size=batch_size)
+            if reports and reports[0].pk is None:
+                reports = list(DailyReport.objects.filter(user=user).order_by('date'))
+
+            details = []
+            for report in reports:
+                minute = 9 * 60
+                for _ in range(rng.randint(5, 10)):
+                    end = min(minute + rng.choice([30, 45, 60, 60, 90]), 23 * 60 + 59)
+                    details.append(DailyReportDetail(
+                        report=report,
+                        start_time=time(minute // 60, minute % 60),
+                        end_time=time(end // 60, end % 60),
+                        work_title=rng.choice(WORK_TITLES),
+                        client=rng.choice(CLIENTS),
+                        responsible_person=rng.choice(RESPONSIBLE_PERSONS),
+                    ))
+                    minute = min(end, 23 * 60)
+            DailyReportDetail.objects.bulk_create(details, batch_size=batch_size)
+            report_count += len(reports)
+            detail_count += len(details)
+        return report_count, detail_count
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from report import search
+
+
+class Command(BaseCommand):
+    help = '日報の全文検索インデックス（報告事項・コメント・作業詳細）を作り直す'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='対象のデータベース')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        with transaction.atomic(using=connection.alias):
+            if not search.install(connection, rebuild=True):
+                raise CommandError('このデータベースでは SQLite FTS5 の trigram トークナイザーが使えません。')
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT count(*) FROM {search.SEARCH_TABLE}')
+            count = cursor.fetchone()[0]
+        self.stdout.write(self.style.SUCCESS(f'{count}件の日報を検索インデックスに登録しました。'))
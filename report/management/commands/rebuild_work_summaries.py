@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from report.models import DailyReportDetail, WorkHoursDaily, WorkHoursMonthly
+from report.summaries import rebuild_summaries
+
+
+class Command(BaseCommand):
+    help = 'すべての作業詳細から日別・月別の作業時間集計を作り直す'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            daily, monthly = rebuild_summaries(DailyReportDetail, WorkHoursDaily, WorkHoursMonthly)
+        self.stdout.write(self.style.SUCCESS(f'日別 {daily}行、月別 {monthly}行を作成しました。'))
@@ -0,0 +1,252 @@
+import json
+import re
+import subprocess
+import time
+from datetime import datetime, timezone
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from report.exports import REPORT_CSV_HEADER, iter_report_rows, stream_csv
+from report.metrics import percentile
+from report.models import DailyReport, DailyReportDetail
+from report.roles import LEADER_GROUP, UserRoles
+
+SCENARIOS = [
+    'changelist_superuser', 'changelist_superuser_deep', 'changelist_leader',
+    'change_form_load', 'change_form_save', 'export_csv', 'import_csv', 'export_users_csv',
+]
+
+
+class Rollback(Exception):
+    """計測で変更したデータを元に戻すための例外"""
+
+
+class Command(BaseCommand):
+    help = (
+        '日報アプリの主な画面・処理の時間とクエリ数を計測し、結果をJSONで書き出す。'
+        '保存・インポートの変更はロールバックするため、データは変更しない。'
+        '（generate_demo_data で作成したデータでの実行を想定）'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help='各シナリオの計測回数')
+        parser.add_argument('--warmup', type=int, default=1, help='計測前に実行する回数（キャッシュの作成など）')
+        parser.add_argument('--scenario', action='append', choices=SCENARIOS,
+                            help='実行するシナリオ（複数指定可、省略時はすべて）')
+        parser.add_argument('--import-rows', type=int, default=1000, help='import_csv で取り込むCSVの行数')
+        parser.add_argument('--output', help='結果をJSONで書き出すファイル')
+        parser.add_argument('--compare', help='以前の結果（JSON）と比較して表示する')
+
+    def handle(self, *args, **options):
+        self.superuser = User.objects.filter(is_superuser=True, is_active=True).order_by('id').first()
+        self.leader = (
+            User.objects.filter(groups__name=LEADER_GROUP, is_superuser=False, is_active=True, is_staff=True)
+            .order_by('id').first()
+        )
+        if not self.superuser or not self.leader:
+            raise CommandError('スーパーユーザーとリーダーのユーザーが必要です（generate_demo_data で作成できます）')
+        self.report = (
+            UserRoles(self.leader).scope_reports(DailyReport.objects.exclude(user=self.leader))
+            .order_by('-date', '-id').first()
+        )
+        if not self.report:
+            raise CommandError('リーダーが閲覧できる他のユーザーの日報がありません')
+
+        results = {}
+        # テスト用クライアントのホスト名（testserver）を許可する
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            for name in options['scenario'] or SCENARIOS:
+                results[name] = self.run_scenario(name, options)
+                self.print_result(name, results[name])
+
+        payload = {
+            'benchmark': 'report_app',
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'git_commit': self.git_commit(),
+            'repeat': options['repeat'],
+            'dataset': {
+                'users': User.objects.count(),
+                'reports': DailyReport.objects.count(),
+                'details': DailyReportDetail.objects.count(),
+            },
+            'results': results,
+        }
+        if options['compare']:
+            self.print_comparison(options['compare'], results)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(payload, f, ensure_ascii=False, indent=2)
+
+    def git_commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def client_for(self, user):
+        client = Client()
+        client.force_login(user)
+        return client
+
+    def run_scenario(self, name, options):
+        run = getattr(self, f'scenario_{name}')(options)
+        timings = []
+        queries = []
+        sizes = []
+        for i in range(options['warmup'] + options['repeat']):
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                status, size = run()
+                elapsed = (time.perf_counter() - started) * 1000
+            if status >= 400:
+                raise CommandError(f'{name}: HTTP {status}')
+            if i >= options['warmup']:
+                timings.append(elapsed)
+                queries.append(len(captured))
+                sizes.append(size)
+        return {
+            'status': status,
+            'p50_ms': percentile(timings, 50),
+            'min_ms': min(timings),
+            'max_ms': max(timings),
+            'queries': max(queries),
+            'response_bytes': max(sizes),
+        }
+
+    def get(self, client, url, params=None):
+        def run():
+            response = client.get(url, params or {})
+            return response.status_code, self.response_size(response)
+        return run
+
+    def response_size(self, response):
+        if response.streaming:
+            return sum(len(chunk) for chunk in response.streaming_content)
+        return len(response.content)
+
+    def in_rollback(self, func):
+        """func の中の変更をロールバックして、何度実行しても同じデータで計測できるようにする"""
+        def run():
+            result = None
+            try:
+                with transaction.atomic():
+                    result = func()
+                    raise Rollback
+            except Rollback:
+                pass
+            return result
+        return run
+
+    def scenario_changelist_superuser(self, options):
+        return self.get(self.client_for(self.superuser), reverse('admin:report_dailyreport_changelist'))
+
+    def scenario_changelist_superuser_deep(self, options):
+        pages = max(1, DailyReport.objects.count() // 20)
+        return self.get(
+            self.client_for(self.superuser), reverse('admin:report_dailyreport_changelist'), {'p': pages},
+        )
+
+    def scenario_changelist_leader(self, options):
+        return self.get(self.client_for(self.leader), reverse('admin:report_dailyreport_changelist'))
+
+    def scenario_change_form_load(self, options):
+        return self.get(
+            self.client_for(self.leader), reverse('admin:report_dailyreport_change', args=[self.report.pk]),
+        )
+
+    def scenario_change_form_save(self, options):
+        client = self.client_for(self.leader)
+        url = reverse('admin:report_dailyreport_change', args=[self.report.pk])
+        report = self.report
+        details = list(report.details.order_by('start_time', 'id'))
+        data = {
+            'date': report.date.isoformat(),
+            'remarks': report.remarks or '',
+            'comment': 'ベンチマーク',
+            'details-TOTAL_FORMS': len(details),
+            'details-INITIAL_FORMS': len(details),
+            'details-MIN_NUM_FORMS': 0,
+            'details-MAX_NUM_FORMS': 1000,
+        }
+        if report.is_submitted:
+            data['is_submitted'] = 'on'
+        if report.boss_confirmation:
+            data['boss_confirmation'] = 'on'
+        for i, detail in enumerate(details):
+            data.update({
+                f'details-{i}-id': detail.pk,
+                f'details-{i}-report': report.pk,
+                f'details-{i}-start_time': detail.start_time.strftime('%H:%M'),
+                f'details-{i}-end_time': detail.end_time.strftime('%H:%M'),
+                # 1行だけ変更して保存する
+                f'details-{i}-work_title': (detail.work_title or '') + ('（修正）' if i == 0 else ''),
+                f'details-{i}-client': detail.client or '',
+                f'details-{i}-responsible_person': detail.responsible_person or '',
+            })
+
+        def save():
+            response = client.post(url, data)
+            if response.status_code == 200:
+                # フォームのエラーで保存されなかった
+                raise CommandError('change_form_save: 日報を保存できませんでした（フォームの入力エラー）')
+            return response.status_code, self.response_size(response)
+        return self.in_rollback(save)
+
+    def scenario_export_csv(self, options):
+        return self.get(self.client_for(self.superuser), reverse('export_csv'))
+
+    def scenario_import_csv(self, options):
+        # 既存の日報をエクスポートしたCSVを取り込む（日報は既存のものに作業詳細を追加する）
+        rows = list(islice(iter_report_rows(DailyReport.objects.order_by('-date', 'id')), options['import_rows']))
+        content = b''.join(stream_csv(REPORT_CSV_HEADER, rows, encoding='cp932'))
+        client = self.client_for(self.superuser)
+        url = reverse('import_csv')
+        expected = f'{len(rows)}件のデータをインポートしました'
+
+        def upload():
+            response = client.post(url, {'csv_file': SimpleUploadedFile('bench.csv', content, 'text/csv')})
+            # 取り込みのエラーは画面のメッセージで表示され HTTP 200 のままなので、結果のメッセージで成否を確認する
+            # （件数を数えるクエリを足すと計測のクエリ数が変わるため、画面の内容で確認する）
+            body = response.content.decode('utf-8')
+            if expected not in body:
+                error = re.search(r'<div class="error">\s*(.*?)\s*</div>', body, re.S)
+                reason = error.group(1) if error else '結果のメッセージがありません'
+                raise CommandError(f'import_csv: インポートに失敗しました: {reason}')
+            return response.status_code, len(response.content)
+        return self.in_rollback(upload)
+
+    def scenario_export_users_csv(self, options):
+        return self.get(self.client_for(self.superuser), reverse('export_users_csv'))
+
+    def print_result(self, name, result):
+        self.stdout.write(
+            f'{name:28s} p50={result["p50_ms"]:8.1f}ms min={result["min_ms"]:8.1f}ms '
+            f'max={result["max_ms"]:8.1f}ms queries={result["queries"]:4d} size={result["response_bytes"]}'
+        )
+
+    def print_comparison(self, path, results):
+        with open(path, encoding='utf-8') as f:
+            previous = json.load(f)
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'比較: {previous.get("git_commit")} ({previous.get("timestamp")}) → 今回'
+        ))
+        for name, result in results.items():
+            before = previous.get('results', {}).get(name)
+            if not before:
+                continue
+            ratio = result['p50_ms'] / before['p50_ms'] if before['p50_ms'] else None
+            self.stdout.write(
+                f'{name:28s} p50 {before["p50_ms"]:8.1f}ms → {result["p50_ms"]:8.1f}ms'
+                f'{f" (x{ratio:.2f})" if ratio else ""}  queries {before["queries"]} → {result["queries"]}'
+            )
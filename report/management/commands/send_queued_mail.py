@@ -0,0 +1,41 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from report.mailqueue import send_queued_mail
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = '送信キューに登録された通知メールをまとめて送信する（--loop で常駐）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='終了せずに一定間隔で送信を繰り返す')
+        parser.add_argument('--interval', type=float, default=10, help='--loop 時の送信間隔（秒）')
+        parser.add_argument('--batch-size', type=int, default=None, help='1回の接続で送信する最大件数')
+
+    def handle(self, *args, **options):
+        if not options['loop']:
+            self.send_all(options['batch_size'])
+            return
+
+        while True:
+            try:
+                self.send_all(options['batch_size'])
+            except Exception:
+                # 常駐中はDBのロックなどで失敗しても次の周期で再試行する
+                logger.exception('送信キューの処理に失敗しました')
+            close_old_connections()
+            time.sleep(options['interval'])
+
+    def send_all(self, batch_size):
+        # 送信できるメールがなくなるまでバッチ単位で送信する
+        while True:
+            sent, failed = send_queued_mail(batch_size=batch_size)
+            if sent or failed:
+                self.stdout.write(f'送信 {sent}件 / 失敗 {failed}件')
+            if not sent:
+                break
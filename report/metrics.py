@@ -0,0 +1,201 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import ExitStack
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+def percentile(values, percent):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(percent / 100 * len(values)) - 1))
+    return values[index]
+
+
+class MetricsWindow:
+    """URL名ごとの直近の計測値（一定時間・一定件数まで）をプロセス内に保持する"""
+
+    def __init__(self, seconds, max_samples):
+        self.seconds = seconds
+        self.max_samples = max_samples
+        self._samples = defaultdict(lambda: deque(maxlen=self.max_samples))
+        self._lock = threading.Lock()
+
+    def add(self, sample):
+        with self._lock:
+            self._samples[sample['view']].append(sample)
+
+    def _recent(self, now):
+        cutoff = now - self.seconds
+        with self._lock:
+            for view, samples in list(self._samples.items()):
+                while samples and samples[0]['at'] < cutoff:
+                    samples.popleft()
+                if not samples:
+                    del self._samples[view]
+            return {view: list(samples) for view, samples in self._samples.items()}
+
+    def summary(self):
+        """URL名ごとの件数とパーセンタイルを、p95 の遅い順に返す"""
+        rows = []
+        for view, samples in self._recent(time.time()).items():
+            wall = [sample['wall_ms'] for sample in samples]
+            count = len(samples)
+            rows.append({
+                'view': view,
+                'count': count,
+                'p50_ms': percentile(wall, 50),
+                'p95_ms': percentile(wall, 95),
+                'p99_ms': percentile(wall, 99),
+                'max_ms': max(wall),
+                'db_ms': sum(sample['db_ms'] for sample in samples) / count,
+                'queries': sum(sample['queries'] for sample in samples) / count,
+                'duplicate_queries': max(sample['duplicate_queries'] for sample in samples),
+                'response_bytes': sum(sample['response_bytes'] for sample in samples) / count,
+            })
+        rows.sort(key=lambda row: row['p95_ms'], reverse=True)
+        return rows
+
+
+def worker_info():
+    """計測したプロセス（serve_waitress.py の待ち受けアドレスとプロセスID）
+
+    計測値はプロセスごとに持つため、--workers で複数起動した場合はどのプロセスの値かを併せて表示する。
+    """
+    return {'pid': os.getpid(), 'listen': os.environ.get('WAITRESS_LISTEN', '')}
+
+
+window = MetricsWindow(
+    getattr(settings, 'REQUEST_METRICS_WINDOW_SECONDS', 3600),
+    getattr(settings, 'REQUEST_METRICS_MAX_SAMPLES', 1000),
+)
+
+
+def get_slow_logger():
+    """遅いリクエストを1行1件のJSONで書き出すロガー（logs/ 以下でサイズごとにローテーション）
+
+    通常は settings.LOGGING で設定する。設定がない場合のみ、ここでファイルハンドラーを追加する。
+    """
+    slow_logger = logging.getLogger('report.slow_requests')
+    if not slow_logger.handlers:
+        path = getattr(settings, 'REQUEST_METRICS_SLOW_LOG', os.path.join(settings.BASE_DIR, 'logs', 'slow_requests.jsonl'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        handler = RotatingFileHandler(path, maxBytes=10 * 1024 * 1024, backupCount=5, encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        slow_logger.addHandler(handler)
+        slow_logger.setLevel(logging.INFO)
+        slow_logger.propagate = False
+    return slow_logger
+
+
+class QueryRecorder:
+    """connection.execute_wrapper で、SQLの実行時間と同じSQLの繰り返し回数を数える"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+            self.statements[sql] += 1
+
+    @property
+    def duplicates(self):
+        """同じSQL（パラメーター違いを含む）の2回目以降の実行回数。N+1 の目安になる"""
+        return sum(count - 1 for count in self.statements.values() if count > 1)
+
+    def top_duplicates(self, limit=3):
+        return [
+            {'sql': sql[:300], 'count': count}
+            for sql, count in self.statements.most_common(limit) if count > 1
+        ]
+
+
+class RequestMetricsMiddleware:
+    """リクエストごとの処理時間・DB時間・クエリ数・重複クエリ数・レスポンスサイズを記録する
+
+    REQUEST_METRICS_ENABLED が有効な場合のみ動作する（無効なら MiddlewareNotUsed で外れる）。
+    ストリーミングのレスポンス（CSVエクスポートなど）は、送信し終えた時点で記録する。
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_METRICS_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slow_ms = getattr(settings, 'REQUEST_METRICS_SLOW_MS', 1000)
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        recorder = QueryRecorder()
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            stack.close()
+            raise
+
+        if response.streaming:
+            response.streaming_content = self._wrap_stream(
+                response.streaming_content, request, response, started, recorder, stack,
+            )
+        else:
+            stack.close()
+            self.record(request, response, started, recorder, len(response.content))
+        return response
+
+    def _wrap_stream(self, content, request, response, started, recorder, stack):
+        size = 0
+        try:
+            for chunk in content:
+                size += len(chunk)
+                yield chunk
+        finally:
+            stack.close()
+            self.record(request, response, started, recorder, size)
+
+    def record(self, request, response, started, recorder, size):
+        match = request.resolver_match
+        sample = {
+            'at': time.time(),
+            'view': (match.view_name if match else None) or 'unresolved',
+            'wall_ms': (time.perf_counter() - started) * 1000,
+            'db_ms': recorder.seconds * 1000,
+            'queries': recorder.count,
+            'duplicate_queries': recorder.duplicates,
+            'response_bytes': size,
+        }
+        window.add(sample)
+        if sample['wall_ms'] >= self.slow_ms:
+            entry = {
+                'timestamp': datetime.now(timezone.utc).isoformat(),
+                'method': request.method,
+                'path': request.get_full_path()[:500],
+                'status': response.status_code,
+                'user': getattr(getattr(request, 'user', None), 'username', None),
+                **worker_info(),
+                **{key: value for key, value in sample.items() if key != 'at'},
+                'top_duplicates': recorder.top_duplicates(),
+            }
+            try:
+                get_slow_logger().info(json.dumps(entry, ensure_ascii=False))
+            except Exception:
+                logger.exception('遅いリクエストのログを書き込めませんでした')
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.7 on 2026-10-17 18:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('report', '0019_remove_dailyreportdetail_work_detail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_hash', models.CharField(max_length=64, unique=True, verbose_name='ファイルハッシュ')),
+                ('file_name', models.CharField(blank=True, max_length=255, verbose_name='ファイル名')),
+                ('file_size', models.BigIntegerField(default=0, verbose_name='ファイルサイズ')),
+                ('rows_committed', models.PositiveIntegerField(default=0, verbose_name='取り込み済み行数')),
+                ('completed', models.BooleanField(default=False, verbose_name='完了')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='作成日時')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新日時')),
+            ],
+            options={
+                'verbose_name': 'インポート進捗',
+                'verbose_name_plural': 'インポート進捗',
+            },
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.1.7 on 2026-10-17 18:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+from report.dedupe import merge_duplicate_reports
+
+
+def dedupe_reports(apps, schema_editor):
+    # 一意制約を追加する前に、既存の重複した日報をまとめる
+    merge_duplicate_reports(
+        apps.get_model('report', 'DailyReport'),
+        apps.get_model('report', 'DailyReportDetail'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('report', '0020_importcheckpoint'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_reports, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='dailyreport',
+            index=models.Index(fields=['user', '-date'], name='dailyreport_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dailyreport',
+            index=models.Index(fields=['is_submitted', 'date'], name='dailyreport_submitted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dailyreport',
+            index=models.Index(fields=['boss_confirmation', 'date'], name='dailyreport_confirmed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dailyreportdetail',
+            index=models.Index(fields=['report', 'start_time'], name='detail_report_start_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyreport',
+            constraint=models.UniqueConstraint(fields=('user', 'date'), name='unique_dailyreport_user_date'),
+        ),
+    ]
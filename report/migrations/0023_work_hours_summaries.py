@@ -0,0 +1,66 @@
+# Generated by Django 5.1.7 on 2026-10-17 18:39
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+from report.summaries import rebuild_summaries
+
+
+def build_summaries(apps, schema_editor):
+    # 既存の作業詳細から集計テーブルを作成する
+    rebuild_summaries(
+        apps.get_model('report', 'DailyReportDetail'),
+        apps.get_model('report', 'WorkHoursDaily'),
+        apps.get_model('report', 'WorkHoursMonthly'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('report', '0022_outboundemail'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkHoursDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='日付')),
+                ('client', models.CharField(blank=True, default='', max_length=70, verbose_name='得意先')),
+                ('responsible_person', models.CharField(blank=True, default='', max_length=100, verbose_name='担当者')),
+                ('minutes', models.PositiveIntegerField(default=0, verbose_name='作業時間（分）')),
+                ('detail_count', models.PositiveIntegerField(default=0, verbose_name='作業件数')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='ユーザー')),
+            ],
+            options={
+                'verbose_name': '日別作業時間',
+                'verbose_name_plural': '日別作業時間',
+                'ordering': ['-date'],
+                'indexes': [models.Index(fields=['date'], name='workhoursdaily_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'date', 'client', 'responsible_person'), name='unique_workhoursdaily_key')],
+            },
+        ),
+        migrations.CreateModel(
+            name='WorkHoursMonthly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='月の1日', verbose_name='月')),
+                ('client', models.CharField(blank=True, default='', max_length=70, verbose_name='得意先')),
+                ('responsible_person', models.CharField(blank=True, default='', max_length=100, verbose_name='担当者')),
+                ('minutes', models.PositiveIntegerField(default=0, verbose_name='作業時間（分）')),
+                ('detail_count', models.PositiveIntegerField(default=0, verbose_name='作業件数')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='ユーザー')),
+            ],
+            options={
+                'verbose_name': '月別作業時間',
+                'verbose_name_plural': '月別作業時間',
+                'ordering': ['-month'],
+                'indexes': [models.Index(fields=['month'], name='workhoursmonthly_month_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'month', 'client', 'responsible_person'), name='unique_workhoursmonthly_key')],
+            },
+        ),
+        migrations.RunPython(build_summaries, migrations.RunPython.noop),
+    ]
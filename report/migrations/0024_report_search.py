@@ -0,0 +1,23 @@
+from django.db import migrations
+
+from report import search
+
+
+def create_search_index(apps, schema_editor):
+    # 既存の日報から全文検索インデックスを作成する（FTS5が使えない環境では何もしない）
+    search.install(schema_editor.connection)
+
+
+def drop_search_index(apps, schema_editor):
+    search.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('report', '0023_work_hours_summaries'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.7 on 2026-10-17 18:47
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('report', '0024_report_search'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dailyreport',
+            index=models.Index(fields=['date', 'id'], name='dailyreport_date_id_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.7 on 2026-10-17 19:06
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('report', '0025_dailyreport_date_id_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('report_id', models.BigIntegerField(verbose_name='日報ID')),
+                ('user_id', models.IntegerField(blank=True, null=True, verbose_name='ユーザーID')),
+                ('username', models.CharField(blank=True, max_length=150, verbose_name='ユーザー名')),
+                ('date', models.DateField(verbose_name='日付')),
+                ('deleted_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='削除日時')),
+            ],
+            options={
+                'verbose_name': '削除された日報',
+                'verbose_name_plural': '削除された日報',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='dailyreport',
+            index=models.Index(fields=['updated_at'], name='dailyreport_updated_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reporttombstone',
+            index=models.Index(fields=['deleted_at'], name='reporttombstone_deleted_idx'),
+        ),
+    ]
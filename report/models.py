@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 # Create your models here.
 class DailyReport(models.Model):
@@ -19,6 +20,19 @@ class DailyReport(models.Model):
         verbose_name = '日報'
         verbose_name_plural = '日報'
         ordering = ['-date']
+        constraints = [
+            # 同じユーザーの同じ日付の日報は1件のみ
+            models.UniqueConstraint(fields=['user', 'date'], name='unique_dailyreport_user_date'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-date'], name='dailyreport_user_date_idx'),
+            models.Index(fields=['is_submitted', 'date'], name='dailyreport_submitted_idx'),
+            models.Index(fields=['boss_confirmation', 'date'], name='dailyreport_confirmed_idx'),
+            # 一覧のページ送り（(date, id) の続きから取得）用
+            models.Index(fields=['date', 'id'], name='dailyreport_date_id_idx'),
+            # 差分エクスポート（前回以降に更新された日報の取得）用
+            models.Index(fields=['updated_at'], name='dailyreport_updated_at_idx'),
+        ]
 
 class DailyReportDetail(models.Model):
     report = models.ForeignKey(DailyReport, on_delete=models.CASCADE, related_name='details', verbose_name='日報')
@@ -35,6 +49,9 @@ class DailyReportDetail(models.Model):
         verbose_name = '作業詳細'
         verbose_name_plural = '作業詳細'
         ordering = ['start_time']
+        indexes = [
+            models.Index(fields=['report', 'start_time'], name='detail_report_start_idx'),
+        ]
 
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, verbose_name='ユーザー')
@@ -46,3 +63,128 @@ class UserProfile(models.Model):
     class Meta:
         verbose_name = 'ユーザープロファイル'
         verbose_name_plural = 'ユーザープロファイル'
+
+class ImportCheckpoint(models.Model):
+    """CSVインポートの進捗（途中で失敗した場合に続きから再開するため）"""
+    file_hash = models.CharField('ファイルハッシュ', max_length=64, unique=True)
+    file_name = models.CharField('ファイル名', max_length=255, blank=True)
+    file_size = models.BigIntegerField('ファイルサイズ', default=0)
+    rows_committed = models.PositiveIntegerField('取り込み済み行数', default=0)
+    completed = models.BooleanField('完了', default=False)
+    created_at = models.DateTimeField('作成日時', auto_now_add=True)
+    updated_at = models.DateTimeField('更新日時', auto_now=True)
+    
+    def __str__(self):
+        return f"{self.file_name} ({self.rows_committed}行)"
+    
+    class Meta:
+        verbose_name = 'インポート進捗'
+        verbose_name_plural = 'インポート進捗'
+
+class ReportTombstone(models.Model):
+    """削除された日報の記録（差分エクスポートで連携先にも削除を伝えるため）
+
+    ユーザーの削除で日報が削除された場合にも残るよう、ユーザーは外部キーにせず ID と名前で持つ。
+    """
+    report_id = models.BigIntegerField('日報ID')
+    user_id = models.IntegerField('ユーザーID', blank=True, null=True)
+    username = models.CharField('ユーザー名', max_length=150, blank=True)
+    date = models.DateField('日付')
+    deleted_at = models.DateTimeField('削除日時', default=timezone.now)
+    
+    def __str__(self):
+        return f"{self.date} - {self.username or '未設定'}（削除）"
+    
+    class Meta:
+        verbose_name = '削除された日報'
+        verbose_name_plural = '削除された日報'
+        indexes = [
+            models.Index(fields=['deleted_at'], name='reporttombstone_deleted_idx'),
+        ]
+
+class OutboundEmail(models.Model):
+    """送信待ちの通知メール（send_queued_mail コマンドがまとめて送信する）"""
+    STATUS_PENDING = 'pending'
+    STATUS_SENDING = 'sending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, '送信待ち'),
+        (STATUS_SENDING, '送信中'),
+        (STATUS_SENT, '送信済み'),
+        (STATUS_FAILED, '送信失敗'),
+    ]
+
+    subject = models.CharField('件名', max_length=255)
+    body = models.TextField('本文')
+    from_email = models.CharField('送信元', max_length=254)
+    recipients = models.TextField('送信先', help_text='カンマ区切り')
+    status = models.CharField('状態', max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveSmallIntegerField('送信試行回数', default=0)
+    next_attempt_at = models.DateTimeField('次回送信日時', default=timezone.now)
+    # 送信中のメールを取得したワーカーの識別子（同じメールを複数のワーカーが送らないため）
+    claim_token = models.CharField('取得トークン', max_length=32, blank=True, editable=False)
+    last_error = models.TextField('最後のエラー', blank=True)
+    created_at = models.DateTimeField('作成日時', auto_now_add=True)
+    sent_at = models.DateTimeField('送信日時', blank=True, null=True)
+    
+    def __str__(self):
+        return f"{self.subject} ({self.get_status_display()})"
+    
+    @property
+    def recipient_list(self):
+        return [address for address in self.recipients.split(',') if address]
+    
+    class Meta:
+        verbose_name = '送信メール'
+        verbose_name_plural = '送信メール'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outboundemail_pending_idx'),
+        ]
+
+class WorkHoursDaily(models.Model):
+    """ユーザー・日付・得意先・担当者ごとの作業時間の集計（作業詳細から自動で更新）"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name='ユーザー')
+    date = models.DateField('日付')
+    client = models.CharField('得意先', max_length=70, blank=True, default='')
+    responsible_person = models.CharField('担当者', max_length=100, blank=True, default='')
+    minutes = models.PositiveIntegerField('作業時間（分）', default=0)
+    detail_count = models.PositiveIntegerField('作業件数', default=0)
+    
+    class Meta:
+        verbose_name = '日別作業時間'
+        verbose_name_plural = '日別作業時間'
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'date', 'client', 'responsible_person'],
+                name='unique_workhoursdaily_key',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['date'], name='workhoursdaily_date_idx'),
+        ]
+
+class WorkHoursMonthly(models.Model):
+    """ユーザー・月・得意先・担当者ごとの作業時間の集計（日別の集計から自動で更新）"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name='ユーザー')
+    month = models.DateField('月', help_text='月の1日')
+    client = models.CharField('得意先', max_length=70, blank=True, default='')
+    responsible_person = models.CharField('担当者', max_length=100, blank=True, default='')
+    minutes = models.PositiveIntegerField('作業時間（分）', default=0)
+    detail_count = models.PositiveIntegerField('作業件数', default=0)
+    
+    class Meta:
+        verbose_name = '月別作業時間'
+        verbose_name_plural = '月別作業時間'
+        ordering = ['-month']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'month', 'client', 'responsible_person'],
+                name='unique_workhoursmonthly_key',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['month'], name='workhoursmonthly_month_idx'),
+        ]
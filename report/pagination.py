@@ -0,0 +1,88 @@
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from . import caching
+
+
+class KeysetPaginator(Paginator):
+    """日付・IDの順に並んだ日報を、OFFSET ではなく (date, id) の続きから取得するページネーター
+
+    各ページの直前の行の (date, id) をキャッシュに覚えておき、次のページは
+    「その行より後」を LIMIT だけで取得する。覚えていないページに飛んだ場合も、
+    一番近い既知のページから (date, id) だけを数えて境界を求める。
+    件数もキャッシュし、日報が変更されるまで COUNT(*) を実行しない。
+
+    並び順が (date, id) 以外（列見出しで並べ替えた場合など）は通常の OFFSET で取得する。
+    """
+
+    key_fields = ('date', 'id')
+
+    @cached_property
+    def _cache_parts(self):
+        return caching.queryset_fingerprint(self.object_list) + (self.per_page,)
+
+    def _cache_key(self, name):
+        return caching.make_key(f'paginator:{name}', *self._cache_parts)
+
+    @cached_property
+    def count(self):
+        key = self._cache_key('count')
+        count = cache.get(key)
+        if count is None:
+            count = self.object_list.count()
+            cache.set(key, count, caching.get_timeout())
+        return count
+
+    @cached_property
+    def descending(self):
+        """(date, id) で並んでいれば降順かどうか、それ以外の並び順なら None"""
+        ordering = [
+            field.replace('pk', 'id') for field in self.object_list.query.order_by
+            if isinstance(field, str)
+        ]
+        if [field.lstrip('-') for field in ordering] != list(self.key_fields):
+            return None
+        signs = {field.startswith('-') for field in ordering}
+        return signs.pop() if len(signs) == 1 else None
+
+    def _after(self, queryset, key):
+        """(date, id) が key より後ろの行に絞り込む"""
+        if key is None:
+            return queryset
+        date, pk = key
+        if self.descending:
+            return queryset.filter(Q(date__lt=date) | Q(date=date, id__lt=pk))
+        return queryset.filter(Q(date__gt=date) | Q(date=date, id__gt=pk))
+
+    def _boundary(self, number, boundaries):
+        """ページ number の直前の行の (date, id)"""
+        if number == 1:
+            return None
+        if number not in boundaries:
+            known = max((page for page in boundaries if page < number), default=1)
+            skip = (number - known) * self.per_page - 1
+            # 日付とIDだけをインデックスから数えるため、行全体を OFFSET で読むより軽い
+            keys = (
+                self._after(self.object_list, boundaries.get(known))
+                .values_list(*self.key_fields)[skip:skip + 1]
+            )
+            boundaries[number] = keys[0] if keys else None
+        return boundaries[number]
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if self.descending is None or self.orphans:
+            return super().page(number)
+
+        key = self._cache_key('boundaries')
+        boundaries = cache.get(key) or {}
+        object_list = self._after(self.object_list, self._boundary(number, boundaries))[:self.per_page]
+        rows = list(object_list)
+        if len(rows) == self.per_page:
+            # 次のページはこのページの最後の行の続きから取得できる
+            boundaries[number + 1] = (rows[-1].date, rows[-1].pk)
+        cache.set(key, boundaries, caching.get_timeout())
+        # 評価済みのクエリセットを渡すので、一覧の表示で再度クエリは実行されない
+        return self._get_page(object_list, number, self)
@@ -0,0 +1,103 @@
+from django.contrib.auth.models import User
+from django.db.models import Case, Value, When
+from django.utils.functional import cached_property
+
+# 権限判定に使うグループ名
+LEADER_GROUP = 'リーダー'
+
+
+class UserRoles:
+    """ログインユーザーの所属グループと閲覧できるメンバーをまとめて保持する
+
+    グループ名と閲覧可能なユーザーIDはそれぞれ最初に参照したときに1回だけ
+    取得し、同じリクエスト内の各権限チェックで使い回す。
+    """
+
+    def __init__(self, user):
+        self.user = user
+
+    @cached_property
+    def _groups(self):
+        if not self.user.is_authenticated:
+            return []
+        return list(self.user.groups.values_list('id', 'name'))
+
+    @cached_property
+    def group_names(self):
+        return frozenset(name for _, name in self._groups)
+
+    @property
+    def is_superuser(self):
+        return self.user.is_superuser
+
+    @property
+    def is_leader(self):
+        return LEADER_GROUP in self.group_names
+
+    @property
+    def can_confirm(self):
+        """上司確認・コメントを編集できるか（スーパーユーザーまたはリーダー）"""
+        return self.is_superuser or self.is_leader
+
+    def in_group(self, name):
+        return name in self.group_names
+
+    @cached_property
+    def team_group_ids(self):
+        """リーダー以外の所属グループのID"""
+        return frozenset(group_id for group_id, name in self._groups if name != LEADER_GROUP)
+
+    @cached_property
+    def visible_user_ids(self):
+        """日報を閲覧・編集できるユーザーのID（スーパーユーザーは全員なので None）"""
+        if self.is_superuser:
+            return None
+        ids = {self.user.pk}
+        # リーダーは自分の所属グループのメンバーの日報も閲覧可能
+        if self.is_leader and self.team_group_ids:
+            ids.update(
+                User.objects.filter(groups__in=self.team_group_ids)
+                .values_list('id', flat=True)
+                .distinct()
+            )
+        return frozenset(ids)
+
+    def can_view_user(self, user_id):
+        if self.is_superuser:
+            return True
+        return user_id in self.visible_user_ids
+
+    def can_view_report(self, report):
+        return self.can_view_user(report.user_id)
+
+    def scope_reports(self, queryset):
+        """日報のクエリセットを閲覧可能な範囲に絞り込む"""
+        return self.scope_by_user(queryset)
+
+    def scope_by_user(self, queryset, field='user_id'):
+        """user を持つモデル（日報・作業時間の集計など）を閲覧可能なユーザーの分に絞り込む"""
+        if self.is_superuser:
+            return queryset
+        return queryset.filter(**{f'{field}__in': self.visible_user_ids})
+
+    def annotate_can_confirm(self, queryset):
+        """各日報に上司確認を編集できるかどうか（can_edit）をSQLで付与する"""
+        if self.is_superuser:
+            can_edit = Value(True)
+        elif self.is_leader:
+            can_edit = Case(
+                When(user_id__in=self.visible_user_ids, then=Value(True)),
+                default=Value(False),
+            )
+        else:
+            can_edit = Value(False)
+        return queryset.annotate(can_edit=can_edit)
+
+
+def get_roles(request):
+    """リクエストごとに1つだけ UserRoles を作成して使い回す"""
+    roles = getattr(request, '_report_roles', None)
+    if roles is None or roles.user is not request.user:
+        roles = UserRoles(request.user)
+        request._report_roles = roles
+    return roles
@@ -0,0 +1,24 @@
+class CacheRouter:
+    """DatabaseCache のテーブル（django_cache）だけを cache データベースに置くルーター
+
+    キャッシュとセッションの読み書きが、日報の保存と同じ SQLite ファイルの書き込みロックを取り合わないようにする。
+    """
+    app_label = 'django_cache'
+    database = 'cache'
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label == self.app_label:
+            return self.database
+        return None
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label == self.app_label:
+            return self.database
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if app_label == self.app_label:
+            return db == self.database
+        if db == self.database:
+            return False
+        return None
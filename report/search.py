@@ -0,0 +1,182 @@
+import logging
+
+from django.db import OperationalError, connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.text import smart_split, unescape_string_literal
+
+logger = logging.getLogger(__name__)
+
+# 日報の全文検索インデックス（SQLite FTS5）
+# rowid を日報IDとし、作業詳細の各項目は日報ごとに改行でつないで1行にまとめる
+SEARCH_TABLE = 'report_search'
+SEARCH_COLUMNS = ('remarks', 'comment', 'work_title', 'client', 'responsible_person')
+
+# trigram は3文字単位で索引するため、これより短い語はインデックスを使えない
+MIN_MATCH_LENGTH = 3
+
+# 日報1件分の検索用の行を作り直すSQL（{report_id} に日報IDの式が入る）
+_REFRESH_SQL = f'''
+    DELETE FROM {SEARCH_TABLE} WHERE rowid = {{report_id}};
+    INSERT INTO {SEARCH_TABLE} (rowid, {', '.join(SEARCH_COLUMNS)})
+    SELECT r.id, coalesce(r.remarks, ''), coalesce(r.comment, ''),
+        coalesce((SELECT group_concat(d.work_title, char(10)) FROM report_dailyreportdetail d WHERE d.report_id = r.id), ''),
+        coalesce((SELECT group_concat(d.client, char(10)) FROM report_dailyreportdetail d WHERE d.report_id = r.id), ''),
+        coalesce((SELECT group_concat(d.responsible_person, char(10)) FROM report_dailyreportdetail d WHERE d.report_id = r.id), '')
+    FROM report_dailyreport r WHERE r.id = {{report_id}};
+'''
+
+# bulk_create や QuerySet.update() でも同期されるよう、シグナルではなくトリガーで更新する
+_TRIGGERS = {
+    'report_search_report_ai': (
+        'AFTER INSERT ON report_dailyreport', _REFRESH_SQL.format(report_id='NEW.id'),
+    ),
+    'report_search_report_au': (
+        'AFTER UPDATE OF remarks, comment ON report_dailyreport', _REFRESH_SQL.format(report_id='NEW.id'),
+    ),
+    'report_search_report_ad': (
+        'AFTER DELETE ON report_dailyreport', f'DELETE FROM {SEARCH_TABLE} WHERE rowid = OLD.id;',
+    ),
+    'report_search_detail_ai': (
+        'AFTER INSERT ON report_dailyreportdetail', _REFRESH_SQL.format(report_id='NEW.report_id'),
+    ),
+    'report_search_detail_au': (
+        'AFTER UPDATE OF report_id, work_title, client, responsible_person ON report_dailyreportdetail',
+        _REFRESH_SQL.format(report_id='OLD.report_id') + _REFRESH_SQL.format(report_id='NEW.report_id'),
+    ),
+    'report_search_detail_ad': (
+        'AFTER DELETE ON report_dailyreportdetail', _REFRESH_SQL.format(report_id='OLD.report_id'),
+    ),
+}
+
+# 接続（DBエイリアス）ごとの検索インデックスの有無
+_available = {}
+
+
+def is_supported(connection):
+    """SQLiteで FTS5 の trigram トークナイザーが使えるか"""
+    if connection.vendor != 'sqlite':
+        return False
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("CREATE VIRTUAL TABLE temp.report_search_probe USING fts5(x, tokenize='trigram')")
+            cursor.execute('DROP TABLE temp.report_search_probe')
+    except OperationalError:
+        return False
+    return True
+
+
+def table_exists(connection):
+    return SEARCH_TABLE in connection.introspection.table_names()
+
+
+def install(connection, rebuild=False):
+    """検索インデックスのテーブルとトリガーを作成する
+
+    テーブルを新しく作成した場合と rebuild=True の場合は、既存の日報から内容を作り直す。
+    戻り値はインデックスを作成できたかどうか。
+    """
+    _available.pop(connection.alias, None)
+    if not is_supported(connection):
+        logger.warning('SQLite の FTS5 (trigram) が使えないため、日報の全文検索インデックスを作成しません')
+        return False
+    created = not table_exists(connection)
+    with connection.cursor() as cursor:
+        if rebuild and not created:
+            cursor.execute(f'DROP TABLE {SEARCH_TABLE}')
+            created = True
+        cursor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} '
+            f"USING fts5({', '.join(SEARCH_COLUMNS)}, tokenize='trigram')"
+        )
+        # テーブルを作り直すマイグレーション（SQLiteのALTER TABLE）でトリガーは消えるため、毎回作成し直す
+        for name, (event, body) in _TRIGGERS.items():
+            cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+            cursor.execute(f'CREATE TRIGGER {name} {event} BEGIN {body} END')
+        if created:
+            populate(cursor)
+    return True
+
+
+def uninstall(connection):
+    _available.pop(connection.alias, None)
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name in _TRIGGERS:
+            cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+        cursor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+
+def populate(cursor):
+    """すべての日報から検索用の行を作成する（作業詳細は日報ごとに1回の集計でまとめる）"""
+    cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+    cursor.execute(f'''
+        INSERT INTO {SEARCH_TABLE} (rowid, {', '.join(SEARCH_COLUMNS)})
+        SELECT r.id, coalesce(r.remarks, ''), coalesce(r.comment, ''),
+            coalesce(d.work_title, ''), coalesce(d.client, ''), coalesce(d.responsible_person, '')
+        FROM report_dailyreport r
+        LEFT JOIN (
+            SELECT report_id,
+                group_concat(work_title, char(10)) AS work_title,
+                group_concat(client, char(10)) AS client,
+                group_concat(responsible_person, char(10)) AS responsible_person
+            FROM report_dailyreportdetail GROUP BY report_id
+        ) d ON d.report_id = r.id
+    ''')
+    cursor.execute(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')")
+
+
+def is_available(using='default'):
+    """検索インデックスが作成済みか（プロセスごとに1回だけ確認する）"""
+    if using not in _available:
+        connection = connections[using]
+        _available[using] = connection.vendor == 'sqlite' and table_exists(connection)
+    return _available[using]
+
+
+def ensure_search_index(sender, using='default', **kwargs):
+    """post_migrate シグナル: マイグレーション後にテーブルとトリガーを作り直す"""
+    connection = connections[using]
+    if connection.vendor != 'sqlite' or not table_exists(connection):
+        return
+    install(connection)
+
+
+def split_terms(search_term):
+    """管理画面の検索と同じく、空白区切り（引用符で囲んだ部分は1語）で検索語に分ける"""
+    terms = []
+    for term in smart_split(search_term):
+        if term.startswith(('"', "'")) and term[0] == term[-1]:
+            term = unescape_string_literal(term)
+        if term:
+            terms.append(term)
+    return terms
+
+
+def _match_query(term):
+    # 記号を含む語もそのまま検索できるよう、フレーズとして囲む
+    return '"' + term.replace('"', '""') + '"'
+
+
+def _escape_like(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def term_condition(term, field='id'):
+    """1つの検索語に一致する日報の条件（Q）
+
+    3文字以上の語はインデックスで検索し、短い語は検索テーブルを LIKE で走査する
+    （作業詳細との結合が不要なので、元のテーブルを走査するより軽い）。
+    """
+    if len(term) >= MIN_MATCH_LENGTH:
+        subquery = RawSQL(
+            f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s', [_match_query(term)]
+        )
+    else:
+        pattern = f'%{_escape_like(term)}%'
+        where = ' OR '.join(f"{column} LIKE %s ESCAPE '\\'" for column in SEARCH_COLUMNS)
+        subquery = RawSQL(
+            f'SELECT rowid FROM {SEARCH_TABLE} WHERE {where}', [pattern] * len(SEARCH_COLUMNS)
+        )
+    return Q(**{f'{field}__in': subquery})
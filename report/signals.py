@@ -0,0 +1,108 @@
+from django.contrib.auth.models import Group, User
+from django.db.models import QuerySet
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import caching, summaries
+from .db import on_commit_batch
+from .models import DailyReport, DailyReportDetail, ReportTombstone, UserProfile
+
+def _report_key(report_id):
+    return DailyReport.objects.filter(pk=report_id).values_list('user_id', 'date').first()
+
+
+def touch_report_on_commit(report_id):
+    """日報の更新日時をトランザクションのコミット後に進める（作業詳細を何件変更しても日報ごとに1回）"""
+    on_commit_batch('touched_reports', _touch_reports, [report_id])
+
+
+def _touch_reports(ids):
+    DailyReport.objects.filter(pk__in=ids).update(updated_at=timezone.now())
+
+
+def _deleted_with_parent(origin):
+    """作業詳細の削除が、日報（やユーザー）の削除に伴うものか"""
+    if isinstance(origin, QuerySet):
+        return origin.model is not DailyReportDetail
+    return origin is not None and not isinstance(origin, DailyReportDetail)
+
+
+@receiver(pre_save, sender=DailyReport)
+def remember_report_key(sender, instance, raw=False, **kwargs):
+    # ユーザー・日付が変わった場合に、変更前の日の集計も更新できるよう覚えておく
+    if raw or instance._state.adding or instance.pk is None:
+        instance._summary_key_before = None
+    else:
+        instance._summary_key_before = _report_key(instance.pk)
+
+
+@receiver(post_save, sender=DailyReport)
+def update_summaries_for_report(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    before = getattr(instance, '_summary_key_before', None)
+    after = (instance.user_id, instance.date)
+    # 作業時間は作業詳細から集計するので、日報側はユーザー・日付が変わったときだけ更新する
+    if before and before != after:
+        summaries.mark_dirty_many([before, after])
+    caching.bump_version_on_commit(caching.REPORTS)
+
+
+@receiver(post_delete, sender=DailyReport)
+def update_summaries_for_deleted_report(sender, instance, **kwargs):
+    summaries.mark_dirty(instance.user_id, instance.date)
+    caching.bump_version_on_commit(caching.REPORTS)
+
+
+@receiver(post_delete, sender=DailyReport)
+def record_deleted_report(sender, instance, **kwargs):
+    # 差分エクスポートで削除を伝えるため、削除した日報を記録する
+    origin = kwargs.get('origin')
+    if isinstance(origin, User) and origin.pk == instance.user_id:
+        # ユーザーの削除に伴う場合は、日報ごとにユーザー名を検索しない
+        username = origin.username
+    elif DailyReport.user.is_cached(instance):
+        username = instance.user.username if instance.user else ''
+    else:
+        username = User.objects.filter(pk=instance.user_id).values_list('username', flat=True).first() or ''
+    ReportTombstone.objects.create(
+        report_id=instance.pk, user_id=instance.user_id, username=username, date=instance.date,
+    )
+
+
+@receiver(post_save, sender=DailyReportDetail)
+@receiver(post_delete, sender=DailyReportDetail)
+def update_summaries_for_detail(sender, instance, raw=False, origin=None, **kwargs):
+    # 日報の削除に伴う場合は、集計・キャッシュは日報の削除で更新し、削除される日報の更新日時も進めない
+    if raw or _deleted_with_parent(origin):
+        return
+    if DailyReportDetail.report.is_cached(instance):
+        report = instance.report
+        key = (report.user_id, report.date)
+    else:
+        key = _report_key(instance.report_id)
+    if key:
+        summaries.mark_dirty(*key)
+    # 差分エクスポートで作業詳細だけの変更も拾えるよう、日報の更新日時を進める
+    touch_report_on_commit(instance.report_id)
+    # 作業詳細は検索結果の件数に影響する
+    caching.bump_version_on_commit(caching.REPORTS)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_user_caches(sender, raw=False, update_fields=None, action=None, **kwargs):
+    # ユーザー名や所属グループ（リーダーが閲覧できる範囲）が変わると絞り込みの選択肢も変わる
+    # （追加のメールアドレスはユーザーのエクスポートに含まれる）
+    if raw or (action and not action.startswith('post_')):
+        return
+    # ログインのたびに last_login だけが保存されるので、その場合は無効にしない
+    if update_fields and set(update_fields) == {'last_login'}:
+        return
+    caching.bump_version_on_commit(caching.USERS)
@@ -0,0 +1,47 @@
+import gzip
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+# .gz を作るファイルの拡張子（画像やフォントは圧縮済みなので対象外）
+GZIP_EXTENSIONS = ('.css', '.js', '.json', '.map', '.svg', '.txt', '.html', '.xml')
+# これより小さいファイルは圧縮しても効果がないので .gz を作らない
+GZIP_MIN_SIZE = 256
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """collectstatic でファイル名に内容のハッシュを付け（base.css → base.1a2b3c4d5e6f.css）、
+    テキストのファイルには gzip で圧縮した .gz も書き出すストレージ
+
+    ハッシュ付きのファイルは内容が変わらないため、Caddy で長期間キャッシュさせ、.gz をそのまま配信する。
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+        for name in sorted(set(self.hashed_files.values())):
+            if name.endswith(GZIP_EXTENSIONS):
+                self.write_gzip(name)
+
+    def stored_name(self, name):
+        # collectstatic を実行し直す前でも画面が 500 にならないよう、マニフェストにないファイルは元の名前で返す
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
+
+    def write_gzip(self, name):
+        path = self.path(name)
+        gz_path = f'{path}.gz'
+        # ハッシュ付きの名前は内容ごとに変わるため、既にあれば同じ内容
+        if os.path.exists(gz_path) or os.path.getsize(path) < GZIP_MIN_SIZE:
+            return
+        with open(path, 'rb') as f:
+            content = f.read()
+        # mtime=0 で、同じファイルからは常に同じ .gz になるようにする
+        compressed = gzip.compress(content, compresslevel=9, mtime=0)
+        if len(compressed) >= len(content):
+            return
+        with open(gz_path, 'wb') as f:
+            f.write(compressed)
@@ -0,0 +1,221 @@
+from collections import defaultdict
+from datetime import date as date_type, timedelta
+
+from django.db.models import Q, Sum
+
+from .db import on_commit_batch, write_atomic
+from .models import DailyReportDetail, WorkHoursDaily, WorkHoursMonthly
+
+# 月の28日に足すと必ず翌月になる日数
+_FOUR_DAYS = timedelta(days=4)
+
+
+def detail_minutes(start_time, end_time):
+    """作業詳細1件の作業時間（分）。終了が開始より前の場合は0とする"""
+    if not start_time or not end_time:
+        return 0
+    minutes = (end_time.hour * 60 + end_time.minute) - (start_time.hour * 60 + start_time.minute)
+    return max(minutes, 0)
+
+
+def month_start(date):
+    return date.replace(day=1)
+
+
+def mark_dirty(user_id, date):
+    """(ユーザー, 日付) の集計をトランザクションのコミット後に更新する"""
+    mark_dirty_many([(user_id, date)])
+
+
+def mark_dirty_many(keys):
+    keys = {(user_id, date) for user_id, date in keys if user_id is not None}
+    if not keys:
+        return
+    # 同じトランザクション内で何度呼ばれても、コミット後に1回でまとめて処理する
+    # 集計の失敗で日報の保存をエラーにしない（rebuild_work_summaries で作り直せる）
+    on_commit_batch('work_summaries', refresh_days, keys)
+
+
+def _aggregate(rows):
+    """(ユーザーID, 日付, 得意先, 担当者, 開始, 終了) の行を集計キーごとに合計する"""
+    totals = defaultdict(lambda: [0, 0])
+    for user_id, date, client, responsible_person, start_time, end_time in rows:
+        total = totals[(user_id, date, client or '', responsible_person or '')]
+        total[0] += detail_minutes(start_time, end_time)
+        total[1] += 1
+    return totals
+
+
+def _detail_rows(detail_model, queryset_filter):
+    return (
+        detail_model.objects
+        .filter(queryset_filter)
+        .values_list(
+            'report__user_id', 'report__date', 'client', 'responsible_person',
+            'start_time', 'end_time',
+        )
+    )
+
+
+def refresh_days(keys, batch_size=200):
+    """指定した (ユーザーID, 日付) の日別集計と、その月の月別集計を作り直す"""
+    keys = sorted(keys, key=lambda key: (key[0], key[1]))
+    with write_atomic():
+        for start in range(0, len(keys), batch_size):
+            batch = keys[start:start + batch_size]
+            key_filter = Q()
+            for user_id, date in batch:
+                key_filter |= Q(user_id=user_id, date=date)
+            WorkHoursDaily.objects.filter(key_filter).delete()
+
+            detail_filter = Q()
+            for user_id, date in batch:
+                detail_filter |= Q(report__user_id=user_id, report__date=date)
+            totals = _aggregate(_detail_rows(DailyReportDetail, detail_filter))
+            WorkHoursDaily.objects.bulk_create([
+                WorkHoursDaily(
+                    user_id=user_id, date=date, client=client,
+                    responsible_person=responsible_person,
+                    minutes=minutes, detail_count=count,
+                )
+                for (user_id, date, client, responsible_person), (minutes, count) in totals.items()
+            ])
+
+        refresh_months({(user_id, month_start(date)) for user_id, date in keys})
+
+
+def refresh_months(keys):
+    """指定した (ユーザーID, 月初日) の月別集計を日別集計から作り直す"""
+    for user_id, month in keys:
+        next_month = (month.replace(day=28) + _FOUR_DAYS).replace(day=1)
+        WorkHoursMonthly.objects.filter(user_id=user_id, month=month).delete()
+        totals = (
+            WorkHoursDaily.objects
+            .filter(user_id=user_id, date__gte=month, date__lt=next_month)
+            .values('client', 'responsible_person')
+            .annotate(total_minutes=Sum('minutes'), total_count=Sum('detail_count'))
+            .order_by()
+        )
+        WorkHoursMonthly.objects.bulk_create([
+            WorkHoursMonthly(
+                user_id=user_id, month=month, client=total['client'],
+                responsible_person=total['responsible_person'],
+                minutes=total['total_minutes'], detail_count=total['total_count'],
+            )
+            for total in totals
+        ])
+
+
+def rebuild_summaries(detail_model, daily_model, monthly_model, batch_size=1000):
+    """すべての作業詳細から日別・月別の集計を作り直す
+
+    マイグレーションからも呼ぶため、モデルクラスは引数で受け取る。
+    戻り値は (日別の行数, 月別の行数)
+    """
+    daily_model.objects.all().delete()
+    monthly_model.objects.all().delete()
+
+    rows = _detail_rows(detail_model, Q(report__user__isnull=False)).order_by()
+    daily = _aggregate(rows.iterator(chunk_size=batch_size))
+
+    monthly = defaultdict(lambda: [0, 0])
+    for (user_id, date, client, responsible_person), (minutes, count) in daily.items():
+        total = monthly[(user_id, month_start(date), client, responsible_person)]
+        total[0] += minutes
+        total[1] += count
+
+    daily_model.objects.bulk_create(
+        (
+            daily_model(
+                user_id=user_id, date=date, client=client,
+                responsible_person=responsible_person,
+                minutes=minutes, detail_count=count,
+            )
+            for (user_id, date, client, responsible_person), (minutes, count) in daily.items()
+        ),
+        batch_size=batch_size,
+    )
+    monthly_model.objects.bulk_create(
+        (
+            monthly_model(
+                user_id=user_id, month=month, client=client,
+                responsible_person=responsible_person,
+                minutes=minutes, detail_count=count,
+            )
+            for (user_id, month, client, responsible_person), (minutes, count) in monthly.items()
+        ),
+        batch_size=batch_size,
+    )
+    return len(daily), len(monthly)
+
+
+
+# 集計画面で選べる集計キー: パラメーター名 -> (フィールド, 表示名)
+SUMMARY_GROUPS = {
+    'user': ('user__username', 'ユーザー'),
+    'client': ('client', '得意先'),
+    'responsible_person': ('responsible_person', '担当者'),
+}
+
+
+def _parse_date(value):
+    try:
+        return date_type.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+
+def parse_summary_params(params):
+    """集計画面のGETパラメーターを解釈する"""
+    period = params.get('period') if params.get('period') in ('month', 'day') else 'month'
+    group_by = [key for key in params.getlist('group_by') if key in SUMMARY_GROUPS] or ['user']
+    return {
+        'period': period,
+        'group_by': group_by,
+        'date_from': _parse_date(params.get('date_from')),
+        'date_to': _parse_date(params.get('date_to')),
+    }
+
+
+def summary_queryset(roles, period='month', group_by=('user',), date_from=None, date_to=None):
+    """集計テーブルから 期間 × 集計キー ごとの作業時間を取得する
+
+    作業詳細ではなく集計済みのテーブルを読むため、行数は ユーザー数 × 期間数 程度に収まる。
+    """
+    if period == 'day':
+        queryset, period_field = WorkHoursDaily.objects.all(), 'date'
+    else:
+        queryset, period_field = WorkHoursMonthly.objects.all(), 'month'
+        date_from = month_start(date_from) if date_from else None
+        date_to = month_start(date_to) if date_to else None
+    if date_from:
+        queryset = queryset.filter(**{f'{period_field}__gte': date_from})
+    if date_to:
+        queryset = queryset.filter(**{f'{period_field}__lte': date_to})
+
+    fields = [SUMMARY_GROUPS[key][0] for key in group_by]
+    return (
+        roles.scope_by_user(queryset)
+        .values(period_field, *fields)
+        .annotate(total_minutes=Sum('minutes'), total_count=Sum('detail_count'))
+        .order_by(f'-{period_field}', *fields)
+    ), period_field, fields
+
+
+def summary_header(period, group_by):
+    return (
+        ['月' if period == 'month' else '日付']
+        + [SUMMARY_GROUPS[key][1] for key in group_by]
+        + ['作業時間（時間）', '作業件数']
+    )
+
+
+def summary_rows(queryset, period_field, fields):
+    """集計結果を表示・CSV用の行に変換する"""
+    for row in queryset:
+        period = row[period_field]
+        yield (
+            [period.strftime('%Y-%m') if period_field == 'month' else period]
+            + [row[field] or '' for field in fields]
+            + [f"{row['total_minutes'] / 60:.2f}", row['total_count']]
+        )
@@ -0,0 +1,23 @@
+from django import template
+from django.contrib.admin.templatetags.admin_list import date_hierarchy
+from django.contrib.admin.templatetags.base import InclusionAdminNode
+
+from report.filters import cached_date_hierarchy_changelist
+
+register = template.Library()
+
+
+def cached_date_hierarchy(cl):
+    return date_hierarchy(cached_date_hierarchy_changelist(cl))
+
+
+@register.tag(name='cached_date_hierarchy')
+def cached_date_hierarchy_tag(parser, token):
+    """{% date_hierarchy cl %} と同じ表示で、日付の一覧をキャッシュから取得する"""
+    return InclusionAdminNode(
+        parser,
+        token,
+        func=cached_date_hierarchy,
+        template_name='date_hierarchy.html',
+        takes_context=False,
+    )
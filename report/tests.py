@@ -0,0 +1,265 @@
+import json
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .exports import format_watermark, parse_watermark
+from .mailqueue import claim_queued_mail, enqueue_email, send_queued_mail
+from .models import DailyReport, DailyReportDetail, OutboundEmail, ReportTombstone
+
+
+class FailingBackend(EmailBackend):
+    """送信のたびに例外を出すSMTPの代わり"""
+
+    def send_messages(self, messages):
+        raise ConnectionError('SMTP unavailable')
+
+
+@override_settings(
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    MAIL_QUEUE_MAX_ATTEMPTS=3,
+    MAIL_QUEUE_RETRY_SECONDS=60,
+    MAIL_QUEUE_RETRY_MAX_SECONDS=3600,
+    MAIL_QUEUE_CLAIM_SECONDS=600,
+)
+class MailQueueTests(TestCase):
+    def setUp(self):
+        self.email = enqueue_email('件名', '本文', 'from@example.com', ['to@example.com', 'cc@example.com'])
+
+    def make_due(self):
+        OutboundEmail.objects.filter(pk=self.email.pk).update(next_attempt_at=timezone.now())
+
+    def test_sends_pending_mail(self):
+        self.assertEqual(send_queued_mail(), (1, 0))
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['to@example.com', 'cc@example.com'])
+        self.email.refresh_from_db()
+        self.assertEqual(self.email.status, OutboundEmail.STATUS_SENT)
+        self.assertEqual(self.email.attempts, 1)
+        self.assertIsNotNone(self.email.sent_at)
+        # 送信済みのメールは再送しない
+        self.assertEqual(send_queued_mail(), (0, 0))
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_failure_is_retried_with_backoff(self):
+        started = timezone.now()
+        self.assertEqual(send_queued_mail(connection=FailingBackend()), (0, 1))
+
+        self.email.refresh_from_db()
+        self.assertEqual(self.email.status, OutboundEmail.STATUS_PENDING)
+        self.assertEqual(self.email.attempts, 1)
+        self.assertIn('SMTP unavailable', self.email.last_error)
+        self.assertGreaterEqual(self.email.next_attempt_at, started + timedelta(seconds=60))
+        # 再送時刻になるまでは送信しない
+        self.assertEqual(send_queued_mail(), (0, 0))
+
+        self.make_due()
+        started = timezone.now()
+        send_queued_mail(connection=FailingBackend())
+        self.email.refresh_from_db()
+        self.assertEqual(self.email.attempts, 2)
+        self.assertGreaterEqual(self.email.next_attempt_at, started + timedelta(seconds=120))
+
+        # 再送で送信できれば送信済みになる
+        self.make_due()
+        self.assertEqual(send_queued_mail(), (1, 0))
+        self.email.refresh_from_db()
+        self.assertEqual(self.email.status, OutboundEmail.STATUS_SENT)
+        self.assertEqual(self.email.last_error, '')
+
+    def test_gives_up_after_max_attempts(self):
+        for _ in range(3):
+            self.make_due()
+            send_queued_mail(connection=FailingBackend())
+
+        self.email.refresh_from_db()
+        self.assertEqual(self.email.status, OutboundEmail.STATUS_FAILED)
+        self.assertEqual(self.email.attempts, 3)
+        self.make_due()
+        self.assertEqual(send_queued_mail(), (0, 0))
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_claimed_mail_is_not_sent_by_another_worker(self):
+        # 別のワーカーが取得して送信中のメールは、重なって動いた送信処理では送らない
+        claimed = claim_queued_mail(10)
+        self.assertEqual([email.pk for email in claimed], [self.email.pk])
+        self.assertEqual(claim_queued_mail(10), [])
+        self.assertEqual(send_queued_mail(), (0, 0))
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_stale_claim_is_taken_over(self):
+        # 送信中のままワーカーが落ちた場合は、取得の期限を過ぎると再度送信する
+        claim_queued_mail(10)
+        OutboundEmail.objects.filter(pk=self.email.pk).update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(send_queued_mail(), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+
+
+@override_settings(DELTA_EXPORT_LAG_SECONDS=0)
+class DeltaExportTests(TestCase):
+    # CACHE_BACKEND=sqlite で実行した場合、セッション・キャッシュは cache データベースに保存される
+    databases = '__all__'
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(self.admin)
+        self.url = reverse('export_delta')
+        # テストデータの作成はコミット済みとして扱い、コミット後の処理もここで済ませる
+        with self.captureOnCommitCallbacks(execute=True):
+            self.report = DailyReport.objects.create(user=self.admin, date=date(2025, 7, 1), remarks='報告')
+            for hour in range(9, 16):
+                DailyReportDetail.objects.create(report=self.report, start_time=time(hour), end_time=time(hour + 1))
+
+    def get_delta(self, query=''):
+        response = self.client.get(f'{self.url}{query}')
+        self.assertEqual(response.status_code, 200)
+        return response, json.loads(b''.join(response.streaming_content))
+
+    def test_watermark_round_trips_without_url_encoding(self):
+        response, first = self.get_delta()
+        watermark = response['X-Delta-Watermark']
+        self.assertEqual(first['watermark'], watermark)
+        self.assertNotIn('+', watermark)
+        self.assertEqual([report['id'] for report in first['reports']], [self.report.pk])
+
+        # 出力されたウォーターマークを、そのまま次回の since に付ける
+        response, second = self.get_delta(f'?since={watermark}')
+        self.assertEqual(second['since'], watermark)
+        self.assertEqual(second['reports'], [])
+
+    def test_offset_with_unencoded_plus_is_accepted(self):
+        expected = datetime(2025, 7, 1, 0, 0, tzinfo=dt_timezone.utc)
+        # URLエンコードされていない + は空白になって届く
+        self.assertEqual(parse_watermark('2025-07-01T09:00:00 09:00'), expected)
+        self.assertEqual(parse_watermark(format_watermark(expected)), expected)
+        response, data = self.get_delta('?since=2025-07-01T09:00:00+09:00')
+        self.assertEqual(data['since'], '2025-07-01T00:00:00.000000Z')
+        self.assertEqual(self.client.get(f'{self.url}?since=yesterday').status_code, 400)
+
+    def test_deleting_report_does_not_touch_it_per_detail(self):
+        report_id = self.report.pk
+        with CaptureQueriesContext(connection) as captured:
+            self.report.delete()
+        updates = [query['sql'] for query in captured if query['sql'].startswith('UPDATE "report_dailyreport"')]
+        self.assertEqual(updates, [])
+        # 作業詳細ごとに日報を検索しない
+        self.assertLess(len(captured), 15)
+        self.assertTrue(ReportTombstone.objects.filter(report_id=report_id, username='admin').exists())
+
+    def test_detail_changes_touch_report_once_after_commit(self):
+        DailyReport.objects.filter(pk=self.report.pk).update(updated_at=timezone.now() - timedelta(days=1))
+        with CaptureQueriesContext(connection) as captured:
+            with self.captureOnCommitCallbacks(execute=True):
+                for detail in self.report.details.all():
+                    detail.work_title = '修正'
+                    detail.save()
+        updates = [query['sql'] for query in captured if query['sql'].startswith('UPDATE "report_dailyreport"')]
+        self.assertEqual(len(updates), 1)
+        self.report.refresh_from_db()
+        self.assertGreater(self.report.updated_at, timezone.now() - timedelta(minutes=1))
+
+    def test_rolled_back_touch_is_not_carried_into_next_transaction(self):
+        other = DailyReport.objects.create(user=self.admin, date=date(2025, 7, 2))
+        past = timezone.now() - timedelta(days=1)
+        DailyReport.objects.update(updated_at=past)
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError):
+                with transaction.atomic():
+                    detail = self.report.details.first()
+                    detail.work_title = '取り消す変更'
+                    detail.save()
+                    raise RuntimeError
+            DailyReportDetail.objects.create(report=other, start_time=time(9), end_time=time(10))
+        # ロールバックした作業詳細の日報は、次にコミットされた変更と一緒に更新されない
+        self.report.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(self.report.updated_at, past)
+        self.assertGreater(other.updated_at, past)
+
+
+class ExportCsvTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+
+    def test_bad_date_is_rejected_instead_of_exporting_everything(self):
+        response = self.client.get(reverse('export_csv'), {'date_from': '2025-13-01'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('date_from', response.content.decode('utf-8'))
+        self.assertEqual(self.client.get(reverse('export_csv'), {'date_from': '2025-07-01'}).status_code, 200)
+
+
+class DailyReportAddTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        self.url = reverse('admin:report_dailyreport_add')
+
+    def post_add_form(self, rows):
+        # 新規作成画面に初期値（パターンA）のまま表示される7行を、そのまま送信する
+        data = {
+            'date': '2025-07-01', 'remarks': '', 'comment': '',
+            'details-TOTAL_FORMS': len(rows), 'details-INITIAL_FORMS': 0,
+            'details-MIN_NUM_FORMS': 0, 'details-MAX_NUM_FORMS': 1000,
+        }
+        for i, row in enumerate(rows):
+            data.update({f'details-{i}-{name}': value for name, value in row.items()})
+        response = self.client.post(self.url, data)
+        self.assertEqual(response.status_code, 302)
+        return DailyReport.objects.get(date=date(2025, 7, 1))
+
+    def initial_rows(self):
+        hours = [('09:00', '10:00'), ('10:00', '11:00'), ('11:00', '12:00'), ('13:00', '14:00'),
+                 ('14:00', '15:00'), ('15:00', '16:00'), ('16:00', '17:30')]
+        return [
+            {'start_time': start, 'end_time': end, 'work_title': '', 'client': '', 'responsible_person': ''}
+            for start, end in hours
+        ]
+
+    def test_untouched_prefilled_rows_are_not_saved(self):
+        report = self.post_add_form(self.initial_rows())
+        self.assertEqual(report.details.count(), 0)
+
+    def test_edited_prefilled_row_is_saved(self):
+        rows = self.initial_rows()
+        rows[2]['work_title'] = '打ち合わせ'
+        report = self.post_add_form(rows)
+        self.assertEqual(
+            list(report.details.values_list('start_time', 'work_title')), [(time(11), '打ち合わせ')]
+        )
+
+
+class ChangelistConditionalTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(self.admin)
+        self.url = reverse('admin:report_dailyreport_changelist')
+        self.report = DailyReport.objects.create(user=self.admin, date=date(2025, 7, 1))
+
+    def test_unchanged_list_is_not_modified_without_scanning_reports(self):
+        # 1回目の表示で CSRF の Cookie が発行される（ETag の材料になる）
+        self.client.get(self.url)
+        etag = self.client.get(self.url)['ETag']
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        # ログインユーザーの取得以外に、日報を数えるクエリを発行しない
+        self.assertEqual([query['sql'] for query in captured if 'report_dailyreport' in query['sql']], [])
+
+        # 日報が変更されると世代が進み、一覧を描画し直す
+        with self.captureOnCommitCallbacks(execute=True):
+            self.report.remarks = '変更'
+            self.report.save()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
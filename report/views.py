@@ -1,176 +1,230 @@
 from django.shortcuts import render, redirect
-from django.http import HttpResponse
+from django.http import HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
 from .models import DailyReport, DailyReportDetail, UserProfile
+from .exports import (
+    USER_CSV_HEADER, delta_querysets, delta_window, filter_reports, format_watermark, iter_users, parse_watermark,
+    report_csv_response, stream_csv, stream_delta, stream_json, user_csv_row, user_record,
+)
+from .imports import MAX_REPORTED_ERRORS, ReportCsvImporter, get_checkpoint, read_csv, restart_checkpoint
+from .roles import get_roles
+from . import cachestore, caching, conditional, metrics
+from django.conf import settings
+from .summaries import SUMMARY_GROUPS, parse_summary_params, summary_header, summary_queryset, summary_rows
 import csv
 from datetime import datetime
 from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
 from django.contrib.auth.models import User, Group
-from django.db import transaction
+from django.db import connection, transaction
+from django.db.models import Count, Max
+from django.views.decorators.cache import never_cache
+import logging
+
+logger = logging.getLogger(__name__)
 
 # Create your views here.
 
 @staff_member_required
 def export_csv(request):
-    # レスポンスの設定
-    response = HttpResponse(content_type='text/csv; charset=cp932')
-    response['Content-Disposition'] = f'attachment; filename="daily_report_{datetime.now().strftime("%Y%m%d")}.csv"'
-    
-    # CSVライターの設定
-    writer = csv.writer(response)
-    
-    # ヘッダーの書き込み
-    writer.writerow([
-        '日付', 'ユーザー', '開始時間', '終了時間', '作業内容', '得意先', '担当者', 
-        '報告事項', 'コメント', '上司確認', '提出状態'
-    ])
-    
-    # 日報データの取得
-    reports = DailyReport.objects.all().order_by('-date')
+    # 日報データの取得（閲覧可能な範囲に絞り込み、GETパラメーターの条件をSQLで適用する）
+    reports = get_roles(request).scope_reports(DailyReport.objects.all())
+    try:
+        reports, details = filter_reports(reports, request.GET)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
     
-    # データの書き込み
-    for report in reports:
-        details = report.details.all()
-        if details:
-            for detail in details:
-                writer.writerow([
-                    report.date,
-                    report.user.username if report.user else '',
-                    detail.start_time,
-                    detail.end_time,
-                    detail.work_title or '',
-                    detail.client or '',
-                    detail.responsible_person or '',
-                    report.remarks or '',
-                    report.comment or '',
-                    '確認済' if report.boss_confirmation else '未確認',
-                    '提出済' if report.is_submitted else '下書き'
-                ])
-        else:
-            # 詳細がない場合は空の行を追加
-            writer.writerow([
-                report.date,
-                report.user.username if report.user else '',
-                '', '', '', '', '',
-                report.remarks or '',
-                report.comment or '',
-                '確認済' if report.boss_confirmation else '未確認',
-                '提出済' if report.is_submitted else '下書き'
-            ])
-    
-    return response
+    # 前回のダウンロードから対象の日報が変わっていなければ 304 を返す（ファイル名に日付が入るため日付も含める）
+    # チャンク単位で読み込みながらストリーミングする
+    return conditional.respond(
+        request,
+        lambda: conditional.queryset_version(request, reports, datetime.now().date()),
+        lambda: report_csv_response(reports.order_by('-date', 'id'), details_queryset=details),
+    )
 
 @staff_member_required
 def import_csv(request):
     if request.method == 'POST' and request.FILES.get('csv_file'):
         csv_file = request.FILES['csv_file']
+        restart = bool(request.POST.get('restart'))
+        importer = ReportCsvImporter()
         
         try:
-            # CSVファイルを読み込み
-            decoded_file = csv_file.read().decode('cp932')
-            csv_data = csv.reader(decoded_file.splitlines())
+            # 同じファイルの取り込みが途中で止まっていた場合は続きから再開する
+            checkpoint = get_checkpoint(csv_file)
+            if checkpoint.completed and not restart:
+                messages.info(
+                    request,
+                    'このファイルは既にインポート済みです。もう一度取り込む場合は'
+                    '「最初から取り込み直す」にチェックを入れてアップロードしてください。'
+                )
+                return render(request, 'report/import.html')
             
-            # ヘッダー行をスキップ
-            next(csv_data)
+            # 取り込む前に全行を検証し、誤りがあれば何もコミットせずに止める
+            errors = importer.validate(read_csv(csv_file))
+            if errors:
+                lines = '、'.join(f'{line}行目: {error}' for line, error in errors[:MAX_REPORTED_ERRORS])
+                more = f' ほか{len(errors) - MAX_REPORTED_ERRORS}行' if len(errors) > MAX_REPORTED_ERRORS else ''
+                messages.error(
+                    request,
+                    f'インポートエラー: {len(errors)}行に誤りがあるため、取り込みませんでした。'
+                    f'修正してから再度アップロードしてください。（{lines}{more}）'
+                )
+                return render(request, 'report/import.html')
             
-            imported_count = 0
+            if restart:
+                restart_checkpoint(checkpoint)
             
-            with transaction.atomic():
-                for row in csv_data:
-                    if len(row) >= 11:  # 必要な列数をチェック（11列に変更）
-                        date_str = row[0]
-                        username = row[1]
-                        start_time = row[2] if row[2] else None
-                        end_time = row[3] if row[3] else None
-                        work_title = row[4] or ''
-                        client = row[5] or ''
-                        responsible_person = row[6] or ''
-                        remarks = row[7] or ''
-                        comment = row[8] or ''
-                        boss_confirmation = row[9] == '確認済'
-                        is_submitted = row[10] == '提出済'
-                        
-                        # ユーザーを取得
-                        try:
-                            user = User.objects.get(username=username) if username else None
-                        except User.DoesNotExist:
-                            continue
-                        
-                        # 日報を取得または作成
-                        report, created = DailyReport.objects.get_or_create(
-                            user=user,
-                            date=datetime.strptime(date_str, '%Y-%m-%d').date(),
-                            defaults={
-                                'remarks': remarks,
-                                'comment': comment,
-                                'boss_confirmation': boss_confirmation,
-                                'is_submitted': is_submitted,
-                            }
-                        )
-                        
-                        # 作業詳細を作成（時間が入力されている場合のみ）
-                        if start_time and end_time:
-                            DailyReportDetail.objects.create(
-                                report=report,
-                                start_time=datetime.strptime(start_time, '%H:%M:%S').time(),
-                                end_time=datetime.strptime(end_time, '%H:%M:%S').time(),
-                                work_title=work_title,
-                                client=client,
-                                responsible_person=responsible_person,
-                            )
-                        
-                        imported_count += 1
-            
-            messages.success(request, f'{imported_count}件のデータをインポートしました。')
+            # CSVファイルをチャンクごとにデコードしながら1行ずつ読み込み（ヘッダー行はスキップ）
+            result = importer.run(read_csv(csv_file), checkpoint=checkpoint)
+            logger.info(
+                'CSVインポート完了: %s件 (スキップ %s件, 再開位置 %s行, 日報作成 %s件, 作業詳細作成 %s件) %s',
+                result.imported_count, result.skipped_count, result.resumed_from,
+                result.created_reports, result.created_details, result.summary(),
+            )
+            messages.success(request, f'{result.imported_count}件のデータをインポートしました。{result.summary()}')
             
         except Exception as e:
-            messages.error(request, f'インポートエラー: {str(e)}')
+            if importer.rows_committed:
+                # データの誤りは取り込み前の検証で弾くため、ここに来るのはDBのロックなどの一時的なエラー
+                messages.error(
+                    request,
+                    f'インポートエラー: {str(e)}（{importer.rows_committed}行目まで取り込み済みです。'
+                    f'ファイルを変更せずに再度アップロードすると続きから取り込みます）'
+                )
+            else:
+                messages.error(request, f'インポートエラー: {str(e)}')
     
     return render(request, 'report/import.html')
 
 def export_view(request):
     return render(request, 'report/export.html')
 
+@staff_member_required
+def export_delta(request):
+    """?since=<前回のウォーターマーク> 以降に更新・削除された日報をJSONで返す（省略時はすべて）
+
+    レスポンスの watermark（X-Delta-Watermark ヘッダーにも同じ値）を次回の since に指定する。
+    """
+    try:
+        since = parse_watermark(request.GET.get('since'))
+    except ValueError:
+        return HttpResponseBadRequest('since はISO 8601形式の日時で指定してください（例: 2025-07-01T00:00:00Z）')
+    since, until = delta_window(since)
+    roles = get_roles(request)
+    reports, tombstones = delta_querysets(
+        roles.scope_reports(DailyReport.objects.all()), since, until, visible_user_ids=roles.visible_user_ids,
+    )
+    response = StreamingHttpResponse(
+        stream_delta(since, until, reports, tombstones), content_type='application/json; charset=utf-8',
+    )
+    response['X-Delta-Watermark'] = format_watermark(until)
+    return response
+
 @staff_member_required
 def export_users_csv(request):
-    """ユーザー情報をCSVでエクスポート"""
-    response = HttpResponse(content_type='text/csv; charset=cp932')
-    response['Content-Disposition'] = f'attachment; filename="users_{datetime.now().strftime("%Y%m%d")}.csv"'
-    
-    writer = csv.writer(response)
-    
-    # ヘッダーの書き込み
-    writer.writerow([
-        'ユーザー名', '姓', '名', 'メールアドレス', 'アクティブ', 'スタッフ権限', 
-        'スーパーユーザー', 'グループ', '追加メールアドレス', '最終ログイン', '登録日'
-    ])
-    
-    # ユーザーデータの取得
-    users = User.objects.all().order_by('username')
+    """ユーザー情報をCSVでエクスポート（?format=json / ndjson でJSON形式）"""
+    return conditional.respond(request, lambda: users_version(request), lambda: render_users_export(request))
+
+def users_version(request):
+    # ユーザーには更新日時がないため、件数・最終ログイン・登録日時とユーザー・グループの世代で判定する
+    version = User.objects.aggregate(
+        count=Count('pk'), last_login=Max('last_login'), date_joined=Max('date_joined'),
+    )
+    etag = conditional.make_etag(request, sorted(version.items()), datetime.now().date(), namespaces=(caching.USERS,))
+    return etag, None
+
+def render_users_export(request):
+    output_format = request.GET.get('format', 'csv')
+    filename = f'users_{datetime.now().strftime("%Y%m%d")}'
+    users = iter_users()
     
-    for user in users:
-        # グループ名を取得
-        groups = ', '.join([group.name for group in user.groups.all()])
-        
-        # UserProfileから追加メールアドレスを取得
-        try:
-            user_profile = UserProfile.objects.get(user=user)
-            additional_emails = user_profile.additional_email or ''
-        except UserProfile.DoesNotExist:
-            additional_emails = ''
-        
-        writer.writerow([
-            user.username,
-            user.last_name,
-            user.first_name,
-            user.email,
-            'アクティブ' if user.is_active else '無効',
-            'あり' if user.is_staff else 'なし',
-            'あり' if user.is_superuser else 'なし',
-            groups,
-            additional_emails,
-            user.last_login.strftime('%Y-%m-%d %H:%M:%S') if user.last_login else '',
-            user.date_joined.strftime('%Y-%m-%d %H:%M:%S')
-        ])
+    if output_format in ('json', 'ndjson'):
+        ndjson = output_format == 'ndjson'
+        response = StreamingHttpResponse(
+            stream_json((user_record(user) for user in users), ndjson=ndjson),
+            content_type='application/x-ndjson; charset=utf-8' if ndjson else 'application/json; charset=utf-8',
+        )
+        response['Content-Disposition'] = f'attachment; filename="{filename}.{output_format}"'
+        return response
     
+    response = StreamingHttpResponse(
+        stream_csv(USER_CSV_HEADER, (user_csv_row(user) for user in users), encoding='cp932'),
+        content_type='text/csv; charset=cp932',
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
     return response
+
+@staff_member_required
+def work_summary(request):
+    """作業時間の集計（ユーザー・得意先・担当者ごと）を表示する"""
+    params = parse_summary_params(request.GET)
+    queryset, period_field, fields = summary_queryset(get_roles(request), **params)
+    context = {
+        'title': '作業時間の集計',
+        'params': params,
+        'groups': [(key, label) for key, (_, label) in SUMMARY_GROUPS.items()],
+        'header': summary_header(params['period'], params['group_by']),
+        'rows': summary_rows(queryset, period_field, fields),
+        'query_string': request.GET.urlencode(),
+    }
+    return render(request, 'report/summary.html', context)
+
+@staff_member_required
+def work_summary_csv(request):
+    """作業時間の集計をCSVでエクスポート"""
+    params = parse_summary_params(request.GET)
+    queryset, period_field, fields = summary_queryset(get_roles(request), **params)
+    response = StreamingHttpResponse(
+        stream_csv(
+            summary_header(params['period'], params['group_by']),
+            summary_rows(queryset, period_field, fields),
+            encoding='cp932',
+        ),
+        content_type='text/csv; charset=cp932',
+    )
+    response['Content-Disposition'] = f'attachment; filename="work_summary_{datetime.now().strftime("%Y%m%d")}.csv"'
+    return response
+
+@staff_member_required
+def request_metrics(request):
+    """URLごとの処理時間（p50/p95/p99）・クエリ数を表示する（REQUEST_METRICS_ENABLED が有効な場合）"""
+    context = {
+        'title': 'リクエストの計測',
+        'enabled': getattr(settings, 'REQUEST_METRICS_ENABLED', False),
+        'window_minutes': metrics.window.seconds // 60,
+        'slow_ms': getattr(settings, 'REQUEST_METRICS_SLOW_MS', 1000),
+        'rows': metrics.window.summary(),
+        'worker': metrics.worker_info(),
+    }
+    return render(request, 'report/metrics.html', context)
+
+@staff_member_required
+def cache_stats(request):
+    """キャッシュの件数・サイズと、キーの種類ごとのヒット率を表示する（一覧のキャッシュの作成もここから行う）"""
+    if request.method == 'POST':
+        if request.POST.get('action') == 'warm':
+            users = cachestore.warm_changelists()
+            messages.success(request, f'{len(users)}人分の閲覧範囲で日報一覧のキャッシュを作成しました。')
+        elif request.POST.get('action') == 'reset':
+            cachestore.stats.reset()
+            messages.success(request, 'ヒット率の集計をリセットしました。')
+        return redirect('cache_stats')
+
+    context = {
+        'title': 'キャッシュの状況',
+        'info': cachestore.backend_info(),
+        'rows': cachestore.stats.summary(),
+        'session_engine': settings.SESSION_ENGINE,
+    }
+    return render(request, 'report/cache_stats.html', context)
+
+@never_cache
+def healthz(request):
+    """Caddy の死活監視用（ログイン不要、DBに接続できれば 200 を返す）"""
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+    except Exception:
+        logger.exception('死活監視: DBに接続できません')
+        return HttpResponse('db error', status=503, content_type='text/plain')
+    return HttpResponse('ok', content_type='text/plain')
@@ -1,5 +1,211 @@
-﻿import os
-os.chdir(r"C:\srv\Daily_Report_Internal")
-from waitress import serve
-from config.wsgi import application
-serve(application, listen="127.0.0.1:8001")
+﻿"""Waitress で日報アプリを起動する
+
+  python serve_waitress.py                      # 127.0.0.1:8001 で1プロセス
+  python serve_waitress.py --workers 4          # 8001〜8004 で4プロセス（親プロセスが監視・再起動する）
+  python serve_waitress.py --workers 4 --caddyfile Caddyfile
+                                                # 4プロセスに振り分ける Caddyfile を書き出して終了
+
+各オプションの既定値は環境変数（WAITRESS_*）で変更できる。Windows（NSSM）・Linux のどちらでも動く。
+"""
+import argparse
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 子プロセスが異常終了したときに再起動するまでの秒数（続けて落ちる場合は最大60秒まで延ばす）
+RESTART_DELAY = 1
+MAX_RESTART_DELAY = 60
+
+
+def env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Waitress で日報アプリを起動する')
+    parser.add_argument('--host', default=os.environ.get('WAITRESS_HOST', '127.0.0.1'), help='待ち受けるアドレス')
+    parser.add_argument('--port', type=int, default=env_int('WAITRESS_PORT', 8001),
+                        help='待ち受けるポート（--workers が2以上なら、ここから連番で使う）')
+    parser.add_argument('--workers', type=int, default=env_int('WAITRESS_WORKERS', 1), help='起動するプロセス数')
+    parser.add_argument('--threads', type=int, default=env_int('WAITRESS_THREADS', 8),
+                        help='1プロセスあたりのリクエスト処理スレッド数')
+    parser.add_argument('--connection-limit', type=int, default=env_int('WAITRESS_CONNECTION_LIMIT', 200),
+                        help='1プロセスが同時に受け付ける接続数（超えた分は backlog で待つ）')
+    parser.add_argument('--channel-timeout', type=int, default=env_int('WAITRESS_CHANNEL_TIMEOUT', 300),
+                        help='無通信の接続を切るまでの秒数（大きなCSVのダウンロードが切れないよう長めにする）')
+    parser.add_argument('--backlog', type=int, default=env_int('WAITRESS_BACKLOG', 1024),
+                        help='accept 待ちの接続数（listen の backlog）')
+    parser.add_argument('--send-buffer', type=int, default=env_int('WAITRESS_SEND_BUFFER', 256 * 1024),
+                        help='ソケットの送信バッファ（SO_SNDBUF、バイト。0 なら OS の既定値）')
+    parser.add_argument('--outbuf-high-watermark', type=int,
+                        default=env_int('WAITRESS_OUTBUF_HIGH_WATERMARK', 16 * 1024 * 1024),
+                        help='送信待ちがこのバイト数を超えたら、アプリからの書き込みを待たせる')
+    parser.add_argument('--caddyfile', metavar='PATH',
+                        help='Waitress は起動せず、各プロセスに振り分ける Caddyfile を書き出す（- なら標準出力）')
+    parser.add_argument('--site', default=os.environ.get('CADDY_SITE', ':80'),
+                        help='Caddyfile のサイトアドレス（例: 192.168.1.196）')
+    parser.add_argument('--static-root', default=os.environ.get('CADDY_STATIC_ROOT', os.path.join(BASE_DIR, 'static')),
+                        help='Caddyfile で /static/ として配信するディレクトリ')
+    return parser
+
+
+def worker_ports(args):
+    return [args.port + i for i in range(max(1, args.workers))]
+
+
+def serve(args):
+    """このプロセスで Waitress を起動する（戻らない）"""
+    os.chdir(BASE_DIR)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+    # /metrics/ や遅いリクエストのログに、どのプロセスの値かを表示するため
+    os.environ['WAITRESS_LISTEN'] = f'{args.host}:{args.port}'
+    from waitress import serve as waitress_serve
+    from config.wsgi import application
+
+    socket_options = [(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)]
+    if args.send_buffer:
+        # 待ち受けソケットに設定すると、受け付けた接続にも引き継がれる
+        socket_options.append((socket.SOL_SOCKET, socket.SO_SNDBUF, args.send_buffer))
+    waitress_serve(
+        application,
+        host=args.host,
+        port=args.port,
+        threads=args.threads,
+        connection_limit=args.connection_limit,
+        channel_timeout=args.channel_timeout,
+        backlog=args.backlog,
+        outbuf_high_watermark=args.outbuf_high_watermark,
+        socket_options=socket_options,
+        ident='daily-report',
+    )
+
+
+def child_command(args, port):
+    return [
+        sys.executable, os.path.abspath(__file__),
+        '--host', args.host,
+        '--port', str(port),
+        '--workers', '1',
+        '--threads', str(args.threads),
+        '--connection-limit', str(args.connection_limit),
+        '--channel-timeout', str(args.channel_timeout),
+        '--backlog', str(args.backlog),
+        '--send-buffer', str(args.send_buffer),
+        '--outbuf-high-watermark', str(args.outbuf_high_watermark),
+    ]
+
+
+def child_env(port):
+    env = dict(os.environ)
+    # 同じログファイルを複数のプロセスでローテーションしないよう、プロセスごとにファイルを分ける
+    env['LOG_FILE_SUFFIX'] = f'-{port}'
+    return env
+
+
+def supervise(args):
+    """ポートごとに子プロセスを起動し、落ちたら再起動する。終了の指示で子プロセスもすべて止める"""
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    for name in ('SIGINT', 'SIGTERM', 'SIGBREAK'):
+        if hasattr(signal, name):
+            signal.signal(getattr(signal, name), stop)
+
+    def start(port):
+        print(f'Waitress を起動: {args.host}:{port}', flush=True)
+        started[port] = time.monotonic()
+        return subprocess.Popen(child_command(args, port), cwd=BASE_DIR, env=child_env(port))
+
+    started = {}
+    children = {port: start(port) for port in worker_ports(args)}
+    delays = {port: RESTART_DELAY for port in children}
+    restart_at = {}
+    try:
+        while not stopping:
+            time.sleep(1)
+            now = time.monotonic()
+            for port, process in children.items():
+                if port in restart_at or process.poll() is None:
+                    continue
+                # しばらく動いていたプロセスなら、待ち時間を最初に戻す
+                if now - started[port] > MAX_RESTART_DELAY:
+                    delays[port] = RESTART_DELAY
+                print(f'Waitress {port} が終了しました（終了コード {process.returncode}）。'
+                      f'{delays[port]}秒後に再起動します', file=sys.stderr, flush=True)
+                restart_at[port] = now + delays[port]
+                delays[port] = min(delays[port] * 2, MAX_RESTART_DELAY)
+            for port, at in list(restart_at.items()):
+                if not stopping and now >= at:
+                    del restart_at[port]
+                    children[port] = start(port)
+    finally:
+        for process in children.values():
+            if process.poll() is None:
+                process.terminate()
+        deadline = time.monotonic() + 10
+        for process in children.values():
+            try:
+                process.wait(timeout=max(0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+def caddyfile(args):
+    """静的ファイルを配信し、各プロセスに振り分けて /healthz/ で死活監視する Caddyfile の内容を返す"""
+    ports = worker_ports(args)
+    upstreams = ' '.join(f'{args.host}:{port}' for port in ports)
+    return f"""# serve_waitress.py --workers {len(ports)} --port {args.port} 用（プロセス数を変えたら
+# python serve_waitress.py --workers N --caddyfile Caddyfile で生成し直す。起動していないポートにも振り分けてしまう）
+{args.site} {{
+    handle_path /static/* {{
+        root * {args.static_root}
+        # collectstatic でハッシュ付きの名前にしたファイルは内容が変わらないため、1年間キャッシュさせる
+        @hashed path_regexp \\.[0-9a-f]{{12}}\\.\\w+$
+        header @hashed Cache-Control "public, max-age=31536000, immutable"
+        # collectstatic で作った .gz があれば、圧縮し直さずにそのまま送る
+        file_server {{
+            precompressed gzip
+        }}
+    }}
+    reverse_proxy {upstreams} {{
+        # 処理中のリクエストが少ないプロセスに送る（CSVエクスポートなどの長いリクエストに偏らない）
+        lb_policy least_conn
+        # 再起動中のプロセスに当たったら、別のプロセスに送り直す
+        lb_try_duration 5s
+        health_uri /healthz/
+        health_interval 10s
+        health_timeout 5s
+        fail_duration 30s
+        # ストリーミングのCSVを溜めずにそのまま送る
+        flush_interval -1
+    }}
+}}
+"""
+
+
+def main():
+    args = build_parser().parse_args()
+    if args.caddyfile:
+        content = caddyfile(args)
+        if args.caddyfile == '-':
+            sys.stdout.write(content)
+        else:
+            with open(args.caddyfile, 'w', encoding='utf-8', newline='\n') as f:
+                f.write(content)
+        return
+    if args.workers > 1:
+        supervise(args)
+    else:
+        serve(args)
+
+
+if __name__ == '__main__':
+    main()